@@ -0,0 +1,248 @@
+"""Materialized per-athlete aggregates maintained by delta updates.
+
+agg_buckets holds run count, distance, moving time and elevation for every
+week/month/year bucket (plus the weekly 4-week moving average); pr_index
+holds every PR candidate ordered by time: the best efforts of runs whose
+details were fetched, a whole-run distance match for the others; load_state
+holds the training-load filters (ATL/CTL) at the last run day. The store calls
+`apply_delta` with the previous and new versions of changed activities, so
+reads are O(buckets) instead of a pass over all activities. `check` compares
+the tables with a full recompute.
+
+Functions take the store's connection; _store owns locking and commits.
+"""
+import json
+from api._frame import ActivityFrame, FLOAT_COLUMNS, parse_day, _num, _period_key
+from api._load import LoadState, activity_load
+from api._utils import DISTANCE_THRESHOLDS, compute_prs, rank_records, summary_record, effort_records
+
+# bumped when a table is added or redefined: stored aggregates are rebuilt once
+VERSION = 2
+PERIODS = ("week", "month", "year")
+SUM_COLUMNS = ("distance", "moving_time", "elev")
+TOLERANCE = 1e-6
+
+
+def _contribution(a):
+    """(day, [runs, distance, moving_time, elev]) for a run, None otherwise."""
+    if not a or a.get("type") != "Run":
+        return None
+    values = [1]
+    for col in SUM_COLUMNS:
+        field, default = FLOAT_COLUMNS[col]
+        values.append(_num(a.get(field), default))
+    return parse_day(a["start_date_local"]), values
+
+
+def _records(a, efforts=None):
+    """pr_index rows (dist_type, record) an activity contributes."""
+    if not a or a.get("type") != "Run":
+        return []
+    if efforts:
+        return effort_records(a, efforts)
+    distance = _num(a.get("distance"), 0.0)
+    return [(dist_type, summary_record(a))
+            for dist_type, (lo, hi) in DISTANCE_THRESHOLDS.items() if lo <= distance <= hi]
+
+
+def read_efforts(conn, athlete_id, ids=None):
+    """{activity_id: best_efforts} for fetched details that have any."""
+    sql = "SELECT id, data FROM activity_details WHERE athlete_id = ?"
+    if ids is None:
+        rows = conn.execute(sql, (athlete_id,)).fetchall()
+    else:
+        ids, rows = list(ids), []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows += conn.execute(f"{sql} AND id IN ({','.join('?' * len(chunk))})", (athlete_id, *chunk)).fetchall()
+    out = {}
+    for aid, data in rows:
+        efforts = json.loads(data).get("best_efforts")
+        if efforts:
+            out[aid] = efforts
+    return out
+
+
+def _replace_records(conn, athlete_id, old, new):
+    gone = [(athlete_id, a["id"]) for a in old if a]
+    if gone:
+        conn.executemany("DELETE FROM pr_index WHERE athlete_id = ? AND activity_id = ?", gone)
+    efforts = read_efforts(conn, athlete_id, [a["id"] for a in new if a and a.get("type") == "Run"])
+    records = [(athlete_id, dist_type, r["activity_id"], r["time"], json.dumps(r))
+               for a in new for dist_type, r in _records(a, efforts.get(a["id"]) if a else None)]
+    if records:
+        conn.executemany(
+            "INSERT OR REPLACE INTO pr_index (athlete_id, dist_type, activity_id, time, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            records,
+        )
+
+
+def apply_delta(conn, athlete_id, old, new):
+    """Subtract `old` activity versions and add `new` ones (either may hold None)."""
+    deltas, loads = {}, {}
+    for sign, acts in ((-1, old), (1, new)):
+        for a in acts:
+            c = _contribution(a)
+            if c is None:
+                continue
+            day, values = c
+            loads[day] = loads.get(day, 0.0) + sign * activity_load(a)
+            for period in PERIODS:
+                d = deltas.setdefault((period, _period_key(day, period)), [0, 0.0, 0.0, 0.0])
+                for i, v in enumerate(values):
+                    d[i] += sign * v
+
+    rows = [(athlete_id, p, k, *d) for (p, k), d in deltas.items() if any(d)]
+    if rows:
+        conn.executemany(
+            "INSERT INTO agg_buckets (athlete_id, period, key, runs, distance, moving_time, elev) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(athlete_id, period, key) DO UPDATE SET "
+            "runs = runs + excluded.runs, distance = distance + excluded.distance, "
+            "moving_time = moving_time + excluded.moving_time, elev = elev + excluded.elev",
+            rows,
+        )
+        conn.execute("DELETE FROM agg_buckets WHERE athlete_id = ? AND runs <= 0", (athlete_id,))
+        _refresh_ma(conn, athlete_id, [r[2] for r in rows if r[1] == "week"])
+
+    _apply_loads(conn, athlete_id, loads)
+    _replace_records(conn, athlete_id, old, new)
+
+
+def _apply_loads(conn, athlete_id, loads):
+    """Shift the stored ATL/CTL by per-day load changes (O(1) each)."""
+    loads = {day: v for day, v in loads.items() if abs(v) > TOLERANCE}
+    if not loads:
+        return
+    state = read_load(conn, athlete_id)
+    for day in sorted(loads):
+        state.add(day, loads[day])
+    conn.execute(
+        "INSERT OR REPLACE INTO load_state (athlete_id, day, atl, ctl) VALUES (?, ?, ?, ?)",
+        (athlete_id, state.day, state.atl, state.ctl),
+    )
+
+
+def apply_details(conn, athlete_id, runs):
+    """Re-derive the PR rows of runs whose details (best efforts) just arrived."""
+    _replace_records(conn, athlete_id, runs, runs)
+
+
+def _refresh_ma(conn, athlete_id, weeks):
+    """Recompute ma_4w for changed weeks and the three buckets after the last one."""
+    if not weeks:
+        return
+    lo, hi = min(weeks), max(weeks)
+    before = conn.execute(
+        "SELECT key FROM agg_buckets WHERE athlete_id = ? AND period = 'week' AND key < ? "
+        "ORDER BY key DESC LIMIT 3", (athlete_id, lo)
+    ).fetchall()
+    after = conn.execute(
+        "SELECT key FROM agg_buckets WHERE athlete_id = ? AND period = 'week' AND key > ? "
+        "ORDER BY key LIMIT 3", (athlete_id, hi)
+    ).fetchall()
+    rows = conn.execute(
+        "SELECT key, distance FROM agg_buckets WHERE athlete_id = ? AND period = 'week' "
+        "AND key BETWEEN ? AND ? ORDER BY key",
+        (athlete_id, before[-1][0] if before else lo, after[-1][0] if after else hi),
+    ).fetchall()
+
+    # same definition as volume._weekly: mean of the rounded km of the last 4 buckets
+    kms = [round(d / 1000, 2) for _, d in rows]
+    updates = []
+    for i, (key, _) in enumerate(rows):
+        if key >= lo:
+            window = kms[max(0, i - 3):i + 1]
+            updates.append((round(sum(window) / len(window), 2), athlete_id, key))
+    conn.executemany(
+        "UPDATE agg_buckets SET ma_4w = ? WHERE athlete_id = ? AND period = 'week' AND key = ?", updates
+    )
+
+
+def rebuild(conn, athlete_id, runs):
+    """Drop and recompute an athlete's tables from their stored runs."""
+    conn.execute("DELETE FROM agg_buckets WHERE athlete_id = ?", (athlete_id,))
+    conn.execute("DELETE FROM pr_index WHERE athlete_id = ?", (athlete_id,))
+    conn.execute("DELETE FROM load_state WHERE athlete_id = ?", (athlete_id,))
+    apply_delta(conn, athlete_id, [], runs)
+
+
+def read_buckets(conn, athlete_id, period):
+    """(keys, {col: sums, "ma_4w": ...}, counts), shaped like ActivityFrame.group_by."""
+    rows = conn.execute(
+        "SELECT key, runs, distance, moving_time, elev, ma_4w FROM agg_buckets "
+        "WHERE athlete_id = ? AND period = ? ORDER BY key",
+        (athlete_id, period),
+    ).fetchall()
+    sums = {col: [r[i + 2] for r in rows] for i, col in enumerate(SUM_COLUMNS)}
+    if period == "week":
+        sums["ma_4w"] = [r[5] for r in rows]
+    return [r[0] for r in rows], sums, [r[1] for r in rows]
+
+
+def read_prs(conn, athlete_id, lo=None, hi=None):
+    """Same structure as compute_prs, read from the index (records dated lo..hi when given)."""
+    prs = {dist_type: [] for dist_type in DISTANCE_THRESHOLDS}
+    rows = conn.execute(
+        "SELECT dist_type, data FROM pr_index WHERE athlete_id = ? ORDER BY dist_type, time, activity_id",
+        (athlete_id,),
+    ).fetchall()
+    for dist_type, data in rows:
+        if dist_type in prs:
+            r = json.loads(data)
+            if (lo is None and hi is None) or _in_range(parse_day(r["date"]), lo, hi):
+                prs[dist_type].append(r)
+    for dist_type, matching in prs.items():
+        matching.sort(key=lambda r: (r["time"], r["date"]))
+        rank_records(dist_type, matching)
+    return prs
+
+
+def _in_range(day, lo, hi):
+    return (lo is None or day >= lo) and (hi is None or day <= hi)
+
+
+def read_load(conn, athlete_id):
+    row = conn.execute("SELECT day, atl, ctl FROM load_state WHERE athlete_id = ?", (athlete_id,)).fetchone()
+    return LoadState(*row) if row else LoadState()
+
+
+def check(conn, athlete_id, runs):
+    """Differences between the stored tables and a full recompute (empty if consistent)."""
+    frame = ActivityFrame(runs)
+    problems = []
+    for period in PERIODS:
+        keys, sums, counts = frame.group_by(period, list(SUM_COLUMNS))
+        s_keys, s_sums, s_counts = read_buckets(conn, athlete_id, period)
+        if keys != s_keys:
+            problems.append(f"{period}: buckets {sorted(set(keys) ^ set(s_keys))[:10]} differ")
+            continue
+        if counts != s_counts:
+            problems.append(f"{period}: run counts differ")
+        for col in SUM_COLUMNS:
+            bad = [k for k, a, b in zip(keys, sums[col], s_sums[col]) if abs(a - b) > TOLERANCE]
+            if bad:
+                problems.append(f"{period}: {col} differs in {bad[:10]}")
+        if period == "week":
+            kms = [round(d / 1000, 2) for d in sums["distance"]]
+            ma = [round(sum(kms[max(0, i - 3):i + 1]) / len(kms[max(0, i - 3):i + 1]), 2)
+                  for i in range(len(kms))]
+            bad = [k for k, a, b in zip(keys, ma, s_sums["ma_4w"]) if b is None or abs(a - b) > TOLERANCE]
+            if bad:
+                problems.append(f"week: ma_4w differs in {bad[:10]}")
+
+    expected, stored = compute_prs(frame, read_efforts(conn, athlete_id)), read_prs(conn, athlete_id)
+    for dist_type in DISTANCE_THRESHOLDS:
+        a = sorted((r["activity_id"], r["time"]) for r in expected[dist_type])
+        b = sorted((r["activity_id"], r["time"]) for r in stored[dist_type])
+        if a != b:
+            problems.append(f"prs {dist_type}: {len(a)} expected, {len(b)} stored")
+
+    expected, stored = LoadState(), read_load(conn, athlete_id)
+    for a in runs:
+        expected.add(parse_day(a["start_date_local"]), activity_load(a))
+    if expected.day is not None:
+        a, b = expected.at(expected.day), stored.at(expected.day)
+        if any(abs(x - y) > 1e-3 for x, y in zip(a, b)):
+            problems.append(f"load: atl/ctl {a} expected, {b} stored")
+    return problems
@@ -0,0 +1,131 @@
+"""Multi-athlete sync engine: many athletes' syncs spread over a thread pool.
+
+Each athlete is one task, so exactly one worker writes an athlete's rows at
+a time (their shard of the store); a task syncs new activities, fetches
+missing run details and stores precomputed results. Workers share the
+process-wide rate scheduler, which serves the least-served athlete first,
+so every athlete gets an even share of the background budget. Threads, not
+processes: the scheduler and the store connection live in the process.
+Several processes can still split a club with `shard` (athlete_id % n),
+their schedulers converging on Strava's usage headers.
+
+Strava calls are counted on the request timer (a new one outside a request)
+and the report gives activities and calls per second.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api._context import Context
+from api._details import fetch_details
+from api._queue import athlete_token
+from api._ratelimit import BACKGROUND, RateLimitExceeded
+from api._store import list_athletes, sync_step, put_results, result_version
+from api._timing import add_phase, submit, timer_scope
+from api.dashboard import SECTIONS
+
+SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", "4"))
+# per-athlete seconds spent fetching activity details (best efforts)
+DETAIL_BUDGET = float(os.environ.get("CRON_DETAIL_BUDGET", "10"))
+
+PRECOMPUTE = {
+    "cockpit": ("summary", "load"),
+    "volume": ("weekly", "monthly", "yearly", "rolling", "load"),
+    "performance": ("records", "best_by_year", "projections"),
+}
+
+
+def _ms(t0):
+    return round((time.perf_counter() - t0) * 1000, 2)
+
+
+def precompute(athlete_id):
+    """Store default-parameter results for PRECOMPUTE; returns how many were stored."""
+    version = result_version(athlete_id)
+    ctx = Context(athlete_id=athlete_id)
+    results = {
+        f"{module}:{mode}": SECTIONS[module][0][mode](ctx, {})
+        for module, modes in PRECOMPUTE.items() for mode in modes
+    }
+    put_results(athlete_id, results, version)
+    return len(results)
+
+
+def sync_athlete(athlete_id, deadline, detail_budget=DETAIL_BUDGET, results=True):
+    """Sync, fetch details and precompute for one athlete; returns its report entry.
+
+    RateLimitExceeded propagates so the caller can stop scheduling athletes.
+    """
+    entry = {"athlete_id": athlete_id}
+    t = time.perf_counter()
+    token = athlete_token(athlete_id)
+    if token is None:
+        entry["error"] = "no stored tokens"
+        return entry
+    step = sync_step(token, athlete_id, time_budget=deadline - time.time(), priority=BACKGROUND)
+    entry.update(activities=step["count"], pages=step["pages"], complete=step["complete"], sync_ms=_ms(t))
+    add_phase("sync", entry["sync_ms"])
+    if detail_budget > 0:
+        t = time.perf_counter()
+        entry["details"] = fetch_details(token, athlete_id,
+                                         time_budget=min(detail_budget, deadline - time.time() - 1))
+        entry["details_ms"] = _ms(t)
+        add_phase("details", entry["details_ms"])
+    if results:
+        t = time.perf_counter()
+        entry["results"] = precompute(athlete_id)
+        entry["precompute_ms"] = _ms(t)
+        add_phase("precompute", entry["precompute_ms"])
+    return entry
+
+
+def in_shard(athlete_id, shard):
+    """shard = (index, count): athletes with athlete_id % count == index; None = all."""
+    return shard is None or athlete_id % shard[1] == shard[0]
+
+
+def run_batch(athlete_ids=None, workers=SYNC_WORKERS, time_budget=50.0, detail_budget=DETAIL_BUDGET,
+              results=True, shard=None):
+    """Sync `athlete_ids` (default: every stored athlete, least recently synced first) over a pool.
+
+    Athletes not started before the deadline, or after the first
+    RateLimitExceeded, are counted as skipped and resume on the next run.
+    """
+    t0 = time.perf_counter()
+    deadline = time.time() + time_budget
+    ids = [a for a in (list_athletes() if athlete_ids is None else athlete_ids) if in_shard(a, shard)]
+    stop = threading.Event()
+    report = {"athletes": [], "skipped": 0, "workers": workers}
+
+    def task(athlete_id):
+        if stop.is_set() or deadline - time.time() <= 1:
+            return None
+        t = time.perf_counter()
+        try:
+            entry = sync_athlete(athlete_id, deadline, detail_budget, results)
+        except RateLimitExceeded as e:
+            stop.set()
+            entry = {"athlete_id": athlete_id, "error": f"rate limited (retry in {e.retry_after:.0f}s)"}
+        except Exception as e:
+            entry = {"athlete_id": athlete_id, "error": str(e)}
+        entry["ms"] = _ms(t)
+        return entry
+
+    with timer_scope("BATCH", "sync") as timer, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        calls_before = timer.strava["calls"]
+        for entry in [f.result() for f in [submit(pool, task, a) for a in ids]]:
+            if entry is None:
+                report["skipped"] += 1
+            else:
+                report["athletes"].append(entry)
+        calls = timer.strava["calls"] - calls_before
+
+    seconds = max(time.perf_counter() - t0, 1e-6)
+    report["processed"] = sum(1 for e in report["athletes"] if "error" not in e)
+    report["activities"] = sum(e.get("activities", 0) for e in report["athletes"])
+    report["strava_calls"] = calls
+    report["activities_per_s"] = round(report["activities"] / seconds, 1)
+    report["calls_per_s"] = round(calls / seconds, 2)
+    report["duration_ms"] = round(seconds * 1000, 2)
+    return report
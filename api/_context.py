@@ -0,0 +1,125 @@
+"""Per-request intermediates shared by every computation on one activity load."""
+import time
+from datetime import date
+from functools import cached_property
+
+from api._frame import ActivityFrame, to_day, from_day
+from api._load import LoadState, frame_loads, series
+from api._store import load_runs, load_buckets, load_prs, load_training
+from api._timing import add_phase
+from api._utils import compute_prs
+from api._window import DailySeries
+
+
+def date_range(params):
+    """(lo, hi) epoch days of ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive, either optional); None without both.
+
+    Raises ValueError on a malformed date or from after to.
+    """
+    lo, hi = (params.get(k, [None])[0] for k in ("from", "to"))
+    if not lo and not hi:
+        return None
+    try:
+        lo, hi = (to_day(date.fromisoformat(v[:10])) if v else None for v in (lo, hi))
+    except ValueError:
+        raise ValueError("from/to must be dates (YYYY-MM-DD)") from None
+    if lo is not None and hi is not None and lo > hi:
+        raise ValueError("from must not be after to")
+    return lo, hi
+
+
+class Context:
+    """Builds the frame, PRs and daily series lazily, at most once each.
+
+    With an `athlete_id` the runs are loaded on first use and period buckets,
+    PRs and the training-load state come from the store's materialized
+    aggregates; with an explicit activity list everything is computed from
+    the list.
+
+    A `span` (lo, hi) of epoch days (either end None = open) restricts every
+    intermediate to the runs in that range, as the client's date filter does:
+    stored runs are read through the date index, a given list is bisected,
+    PRs are ranked among the range's records and `hi` becomes today when it
+    is earlier. Stored buckets and load state cover the whole history, so a
+    ranged context recomputes them from its runs.
+
+    `timing` records how long each intermediate took (ms) so batched
+    endpoints can attribute shared work separately from their sections.
+    """
+
+    def __init__(self, activities=None, today=None, athlete_id=None, span=None):
+        if activities is not None:
+            self.activities = activities
+        self.athlete_id = athlete_id
+        self.lo, self.hi = span or (None, None)
+        self.ranged = span is not None
+        self.today = today or date.today()
+        if self.hi is not None and self.hi < to_day(self.today):
+            self.today = from_day(self.hi)
+        self.today_day = to_day(self.today)
+        self.timing = {}
+        self._buckets = {}
+
+    def _timed(self, name, fn):
+        t0 = time.perf_counter()
+        value = fn()
+        self.timing[name] = round((time.perf_counter() - t0) * 1000, 2)
+        add_phase(name, self.timing[name])
+        return value
+
+    @cached_property
+    def activities(self):
+        return self._timed("load", lambda: load_runs(self.athlete_id, self.lo, self.hi))
+
+    @cached_property
+    def frame(self):
+        activities = self.activities
+
+        def build():
+            frame = ActivityFrame(activities)
+            i, j = frame.day_slice(self.lo, self.hi)
+            return frame if (i, j) == (0, len(frame)) else frame.take(range(i, j))
+        return self._timed("frame", build)
+
+    @cached_property
+    def prs(self):
+        if self.athlete_id is not None:
+            return self._timed("prs", lambda: load_prs(self.athlete_id, self.lo, self.hi))
+        frame = self.frame
+        return self._timed("prs", lambda: compute_prs(frame))
+
+    def buckets(self, period):
+        """(keys, sums, counts) of distance/moving_time/elev per week, month or year."""
+        if period not in self._buckets:
+            if self.athlete_id is not None and not self.ranged:
+                fn = lambda: load_buckets(self.athlete_id, period)  # noqa: E731
+            else:
+                frame = self.frame
+                fn = lambda: frame.group_by(period, ["distance", "moving_time", "elev"])  # noqa: E731
+            self._buckets[period] = self._timed(f"buckets_{period}", fn)
+        return self._buckets[period]
+
+    @cached_property
+    def daily(self):
+        """Daily distance series running up to today."""
+        frame = self.frame
+        return self._timed("daily", lambda: DailySeries.from_frame(frame, start=self.lo, end=self.today_day))
+
+    @cached_property
+    def training(self):
+        """LoadState (ATL/CTL) at the last run day (at today without an athlete or with a span)."""
+        if self.athlete_id is not None and not self.ranged:
+            return self._timed("training", lambda: load_training(self.athlete_id))
+        daily = self.training_daily
+
+        def from_series():
+            _, atl, ctl = series(daily)
+            return LoadState(daily.end, float(atl[-1]), float(ctl[-1]))
+        return self._timed("training", from_series)
+
+    @cached_property
+    def training_daily(self):
+        """Daily training-load series running up to today."""
+        frame = self.frame
+        return self._timed("training_daily",
+                           lambda: DailySeries(frame["day"], frame_loads(frame), self.lo, self.today_day))
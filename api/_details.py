@@ -0,0 +1,95 @@
+"""Activity-detail fetcher feeding best-effort PRs.
+
+Only runs whose details were never fetched are requested, newest first, and
+the best efforts are kept permanently, so every activity costs one Strava
+call once. Requests run in parallel on the background priority and never
+plan more calls than the quota, the athlete's share and the bucket tokens
+left above the scheduler's reserve, so the athlete's next interactive call
+still goes through; what is left over is picked up by the next cron run or
+sync. Details are stored (and the PR index updated) in batches as they
+arrive.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
+from api._ratelimit import BACKGROUND, RESERVE, ATHLETE_SHARE, BURST, RateLimitExceeded, budget
+from api._store import missing_details, put_details, delete_activity
+from api._timing import phase, submit
+from api._utils import strava_get, token_key
+
+DETAIL_WORKERS = int(os.environ.get("DETAIL_WORKERS", "8"))
+STORE_BATCH = 25
+
+
+def allowance(token):
+    """Detail calls that fit in the background share of the current quota."""
+    b = budget(token_key(token))
+    return max(0, min(
+        b["short"]["remaining"] - int(b["short"]["limit"] * RESERVE),
+        b["daily"]["remaining"] - int(b["daily"]["limit"] * RESERVE),
+        b["athlete"]["remaining"] - int(b["short"]["limit"] * ATHLETE_SHARE * RESERVE),
+        b["tokens"] - int(BURST * RESERVE),
+    ))
+
+
+def fetch_each(token, ids, endpoint, store, deadline, params=None, on_missing=None, priority=BACKGROUND,
+               workers=DETAIL_WORKERS):
+    """Fetch `endpoint.format(id)` for ids in parallel (background priority by default).
+
+    Results reach `store([(id, data), ...])` in batches as they arrive; a 404
+    calls `on_missing(id)`. Stops submitting at `deadline` or on the first
+    RateLimitExceeded. Returns (stored, errors).
+    """
+    queue = iter(ids)
+    batch, stored, errors = [], 0, 0
+    stop = False
+
+    with phase("fetch"), ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def fill():
+            while not stop and len(running) < workers and time.time() < deadline:
+                aid = next(queue, None)
+                if aid is None:
+                    return
+                running[submit(pool, strava_get, token, endpoint.format(aid), params, priority,
+                               max(deadline - time.time(), 0.1))] = aid
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                aid = running.pop(fut)
+                try:
+                    batch.append((aid, fut.result()))
+                except RateLimitExceeded:
+                    stop = True
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 404 and on_missing:
+                        on_missing(aid)
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+            if len(batch) >= STORE_BATCH:
+                store(batch)
+                stored, batch = stored + len(batch), []
+            fill()
+    if batch:
+        store(batch)
+    return stored + len(batch), errors
+
+
+def fetch_details(token, athlete_id, time_budget=10.0, limit=None):
+    """Fetch and store missing run details; returns {"fetched", "pending", "errors"}."""
+    deadline = time.time() + time_budget
+    todo = missing_details(athlete_id)
+    planned = min(len(todo), allowance(token), len(todo) if limit is None else limit)
+    fetched, errors = fetch_each(
+        token, todo[:planned], "/activities/{}",
+        lambda batch: put_details(athlete_id, [d for _, d in batch]), deadline,
+        # deleted or made private since the last sync
+        on_missing=lambda aid: delete_activity(athlete_id, aid),
+    )
+    return {"fetched": fetched, "pending": len(missing_details(athlete_id)), "errors": errors}
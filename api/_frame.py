@@ -0,0 +1,178 @@
+"""Columnar view of an activity list, parsed once.
+
+Dates become epoch-day ints and numeric fields typed float columns (NaN when
+Strava omitted the value). Columns are NumPy arrays when NumPy is installed
+and `array.array` otherwise; every operation has both paths.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+NAN = float("nan")
+
+# column name -> (Strava field, value when missing)
+FLOAT_COLUMNS = {
+    "distance": ("distance", 0.0),
+    "moving_time": ("moving_time", 0.0),
+    "elapsed_time": ("elapsed_time", 0.0),
+    "elev": ("total_elevation_gain", 0.0),
+    "speed": ("average_speed", 0.0),
+    "hr": ("average_heartrate", NAN),
+    "max_hr": ("max_heartrate", NAN),
+    "suffer": ("suffer_score", NAN),
+}
+
+
+def parse_day(s):
+    """Epoch day of an ISO date string ("2024-03-01T07:30:00Z" -> 19783)."""
+    return date(int(s[:4]), int(s[5:7]), int(s[8:10])).toordinal() - EPOCH_ORDINAL
+
+
+def to_day(d):
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def from_day(day):
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def _num(v, default):
+    return default if v is None else float(v)
+
+
+def _int_col(values):
+    return np.asarray(values, dtype=np.int64) if np is not None else array("q", values)
+
+
+def _float_col(values):
+    return np.asarray(values, dtype=np.float64) if np is not None else array("d", values)
+
+
+def _period_key(day, period):
+    d = from_day(day)
+    if period == "year":
+        return d.year
+    if period == "month":
+        return d.year * 100 + d.month
+    # strftime("%W"): Monday-based week, days before the first Monday are week 00
+    yday = d.timetuple().tm_yday - 1
+    return d.year * 100 + (yday + 7 - d.weekday()) // 7
+
+
+class ActivityFrame:
+    def __init__(self, activities=()):
+        rows = sorted(activities, key=lambda a: a.get("start_date_local", ""))
+        self.rows = rows
+        self.cols = {"day": _int_col([parse_day(a["start_date_local"]) for a in rows])}
+        for name, (field, default) in FLOAT_COLUMNS.items():
+            self.cols[name] = _float_col([_num(a.get(field), default) for a in rows])
+        self._keys = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, name):
+        return self.cols[name]
+
+    def take(self, idx):
+        """Frame restricted to the given row indices (kept in date order)."""
+        f = ActivityFrame.__new__(ActivityFrame)
+        f.rows = [self.rows[i] for i in idx]
+        if np is not None:
+            idx = np.asarray(idx, dtype=np.int64)
+            f.cols = {k: v[idx] for k, v in self.cols.items()}
+        else:
+            f.cols = {k: array(v.typecode, [v[i] for i in idx]) for k, v in self.cols.items()}
+        f._keys = {}
+        return f
+
+    def select(self, mask):
+        if np is not None:
+            return self.take(np.flatnonzero(mask))
+        return self.take([i for i, m in enumerate(mask) if m])
+
+    def mask(self, col, lo=None, hi=None, strict=False):
+        """Boolean mask of lo <= col <= hi (lo < col if strict; NaN never matches)."""
+        c = self.cols[col]
+        if np is not None:
+            m = ~np.isnan(c) if c.dtype.kind == "f" else np.ones(len(c), dtype=bool)
+            if lo is not None:
+                m &= (c > lo) if strict else (c >= lo)
+            if hi is not None:
+                m &= c <= hi
+            return m
+        return [v == v and (lo is None or (v > lo if strict else v >= lo)) and (hi is None or v <= hi)
+                for v in c]
+
+    def filter(self, col, lo=None, hi=None, strict=False):
+        return self.select(self.mask(col, lo, hi, strict))
+
+    def day_slice(self, lo=None, hi=None):
+        """Row index range [i, j) with lo <= day <= hi (days are sorted)."""
+        days = self.cols["day"]
+        if np is not None:
+            i = 0 if lo is None else int(np.searchsorted(days, lo, "left"))
+            j = len(days) if hi is None else int(np.searchsorted(days, hi, "right"))
+            return i, j
+        i = 0 if lo is None else bisect_left(days, lo)
+        j = len(days) if hi is None else bisect_right(days, hi)
+        return i, j
+
+    def window_sum(self, col, lo=None, hi=None):
+        """Sum of `col` over activities whose day lies in [lo, hi]."""
+        i, j = self.day_slice(lo, hi)
+        c = self.cols[col][i:j]
+        return float(c.sum()) if np is not None else sum(c)
+
+    def period_keys(self, period):
+        """Integer bucket per row: year, year*100+month or year*100+%W week."""
+        if period in self._keys:
+            return self._keys[period]
+        days = self.cols["day"]
+        if np is not None:
+            d = days.astype("datetime64[D]")
+            years = d.astype("datetime64[Y]")
+            y = years.astype(np.int64) + 1970
+            if period == "year":
+                keys = y
+            elif period == "month":
+                keys = y * 100 + d.astype("datetime64[M]").astype(np.int64) % 12 + 1
+            else:
+                yday = (d - years).astype(np.int64)
+                weekday = (days + 3) % 7
+                keys = y * 100 + (yday + 7 - weekday) // 7
+        else:
+            cache = {}
+            keys = array("q", [cache[x] if x in cache else cache.setdefault(x, _period_key(x, period))
+                               for x in days])
+        self._keys[period] = keys
+        return keys
+
+    def group_sum(self, keys, cols):
+        """Per-key sums of `cols`: (sorted keys, {col: sums}, counts)."""
+        if np is not None:
+            uniq, inv = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inv, minlength=len(uniq))
+            sums = {c: np.bincount(inv, weights=self.cols[c], minlength=len(uniq)).tolist() for c in cols}
+            return uniq.tolist(), sums, counts.tolist()
+        acc = {}
+        columns = [self.cols[c] for c in cols]
+        for i, k in enumerate(keys):
+            row = acc.get(k)
+            if row is None:
+                row = acc[k] = [0] * (len(cols) + 1)
+            row[0] += 1
+            for j, c in enumerate(columns):
+                row[j + 1] += c[i]
+        uniq = sorted(acc)
+        sums = {c: [acc[k][j + 1] for k in uniq] for j, c in enumerate(cols)}
+        return uniq, sums, [acc[k][0] for k in uniq]
+
+    def group_by(self, period, cols):
+        return self.group_sum(self.period_keys(period), cols)
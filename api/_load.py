@@ -0,0 +1,116 @@
+"""Training load: acute (ATL) and chronic (CTL) load and form (TSB).
+
+Each run has a load: Strava's suffer_score (relative effort) when present,
+else a Banister TRIMP from its average heart rate, else its moving minutes.
+ATL and CTL are exponentially weighted filters of the daily load
+(x_d = r * x_{d-1} + (1 - r) * load_d, r = exp(-1 / days), 7 and 42 days);
+TSB = CTL - ATL.
+
+The filters are linear, so a load added (or removed) on any day shifts the
+state at a later day by (1 - r) * load * r^gap: `LoadState` keeps (day, ATL,
+CTL) and absorbs each activity change in O(1), and decays to a later day in
+O(1). Full daily series are computed in chunks with NumPy (one cumulative
+sum per chunk) or with a plain loop.
+"""
+import os
+import math
+from array import array
+
+from api._frame import np, _num
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+HR_REST = float(os.environ.get("HR_REST", "60"))
+HR_MAX = float(os.environ.get("HR_MAX", "190"))
+CHUNK = 256  # r^-CHUNK stays far from overflow for any filter >= 1 day
+
+
+def _decay(days):
+    return math.exp(-1 / days)
+
+
+R_ATL, R_CTL = _decay(ATL_DAYS), _decay(CTL_DAYS)
+
+
+def load_value(suffer, hr, moving_time):
+    """Load of one run from its suffer_score, average HR and moving time (s); NaN/None = missing."""
+    if suffer is not None and suffer == suffer:
+        return float(suffer)
+    minutes = (moving_time or 0.0) / 60
+    if hr is not None and hr == hr and hr > 0:
+        x = min(max((hr - HR_REST) / (HR_MAX - HR_REST), 0.0), 1.0)
+        return minutes * x * 0.64 * math.exp(1.92 * x)
+    return minutes
+
+
+def activity_load(a):
+    return load_value(a.get("suffer_score"), a.get("average_heartrate"), _num(a.get("moving_time"), 0.0))
+
+
+def frame_loads(frame):
+    """Load column of an ActivityFrame."""
+    suffer, hr, mt = frame["suffer"], frame["hr"], frame["moving_time"]
+    if np is not None:
+        minutes = mt / 60
+        x = np.clip((np.nan_to_num(hr) - HR_REST) / (HR_MAX - HR_REST), 0.0, 1.0)
+        trimp = minutes * x * 0.64 * np.exp(1.92 * x)
+        return np.where(~np.isnan(suffer), suffer, np.where(np.nan_to_num(hr) > 0, trimp, minutes))
+    return array("d", [load_value(s, h, m) for s, h, m in zip(suffer, hr, mt)])
+
+
+class LoadState:
+    """ATL and CTL at the end of `day`; loads are added on any day in O(1)."""
+
+    def __init__(self, day=None, atl=0.0, ctl=0.0):
+        self.day, self.atl, self.ctl = day, atl, ctl
+
+    def at(self, day):
+        """(atl, ctl) at the end of `day` (the state itself if `day` is not later)."""
+        if self.day is None:
+            return 0.0, 0.0
+        gap = max(day - self.day, 0)
+        return self.atl * R_ATL ** gap, self.ctl * R_CTL ** gap
+
+    def add(self, day, load):
+        if self.day is None or day > self.day:
+            self.atl, self.ctl = self.at(day)
+            self.day = day
+        gap = self.day - day
+        self.atl += (1 - R_ATL) * load * R_ATL ** gap
+        self.ctl += (1 - R_CTL) * load * R_CTL ** gap
+
+    def rewind(self, loads):
+        """(atl, ctl) len(loads) days before `day`, given the daily loads up to `day`."""
+        atl, ctl = self.atl, self.ctl
+        for load in reversed(loads):
+            atl = (atl - (1 - R_ATL) * load) / R_ATL
+            ctl = (ctl - (1 - R_CTL) * load) / R_CTL
+        return atl, ctl
+
+
+def ewma(values, days):
+    """x_d = r * x_{d-1} + (1 - r) * v_d over a daily column, starting from 0."""
+    r = _decay(days)
+    if np is None:
+        out, x = [], 0.0
+        for v in values:
+            x = r * x + (1 - r) * v
+            out.append(x)
+        return out
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty(len(values))
+    x = 0.0
+    powers = r ** np.arange(CHUNK)
+    for s in range(0, len(values), CHUNK):
+        v = values[s:s + CHUNK]
+        p = powers[:len(v)]
+        # x_{s+i} = r^i * (r * x_{s-1} + (1 - r) * sum_{j<=i} v_j r^-j)
+        out[s:s + len(v)] = p * (r * x + (1 - r) * np.cumsum(v / p))
+        x = out[s + len(v) - 1]
+    return out
+
+
+def series(daily):
+    """(loads, atl, ctl) columns over a DailySeries of loads."""
+    loads = daily.values()
+    return loads, ewma(loads, ATL_DAYS), ewma(loads, CTL_DAYS)
@@ -0,0 +1,219 @@
+"""Race-time model fitted on the best effort of every PR distance at once.
+
+Two least-squares fits share one set of running sums over the current bests
+(one point per distance type, its real distance and time):
+
+    power law       ln T = ln a + b ln D   (Riegel is b = 1.06 from one point)
+    critical speed  D = CS * T + D'
+
+Adding an effort only swaps its distance's point in the sums, so the fit is
+updated in O(1) as efforts arrive in date order (`RaceModel`). With NumPy the
+whole timeline is solved at once: running bests per distance become
+cumulative sums and every fit along the timeline is one vector expression.
+"""
+import math
+from operator import itemgetter
+
+from api._frame import np
+from api._utils import fmt_time
+
+RIEGEL_EXPONENT = 1.06
+EXPONENT_RANGE = (1.0, 1.2)
+DISTANCES = {"5k": 5000, "10k": 10000, "semi": 21097.5, "marathon": 42195}
+# n, sum x, y, xx, xy, yy (x = ln D, y = ln T), sum t, d, tt, td
+N_SUMS = 10
+
+
+def parse_targets(value=None):
+    """[(name, meters)] from "semi,marathon,15000" (PR distance names or meters).
+
+    Raises ValueError on anything else.
+    """
+    if not value:
+        return list(DISTANCES.items())
+    out = []
+    for part in value.split(","):
+        part = part.strip()
+        if part in DISTANCES:
+            out.append((part, DISTANCES[part]))
+        elif part:
+            try:
+                meters = float(part)
+            except ValueError:
+                meters = 0
+            if not 0 < meters < math.inf:
+                raise ValueError(f"invalid distance: {part}")
+            out.append((part, meters))
+    return out
+
+
+def _point(time, distance):
+    x, y = math.log(distance), math.log(time)
+    return (1.0, x, y, x * x, x * y, y * y, time, distance, time * time, time * distance)
+
+
+def efforts(prs):
+    """(date, dist_type, time, distance) of every usable PR record, in date order."""
+    out = []
+    for dist_type, records in prs.items():
+        nominal = DISTANCES.get(dist_type)
+        for r in records:
+            distance = r.get("distance") or nominal
+            if r.get("time") and distance:
+                out.append((r["date"], dist_type, float(r["time"]), float(distance)))
+    out.sort(key=itemgetter(0))
+    return out
+
+
+def solve(sums):
+    """Fit from running sums: {"exponent", "ln_scale", "r2", "points", "cs", "d_prime"} or None."""
+    n, sx, sy, sxx, sxy, syy, st, sd, stt, std = sums
+    if n < 1:
+        return None
+    den = n * sxx - sx * sx
+    b = (n * sxy - sx * sy) / den if n >= 2 and den > 1e-9 else RIEGEL_EXPONENT
+    b = min(max(b, EXPONENT_RANGE[0]), EXPONENT_RANGE[1])
+    c = (sy - b * sx) / n
+    fit = {"exponent": b, "ln_scale": c, "points": int(round(n)), "r2": None, "cs": None, "d_prime": None}
+    ss_tot = syy - sy * sy / n
+    if n >= 3 and ss_tot > 1e-12:
+        ss_res = syy + n * c * c + b * b * sxx - 2 * c * sy - 2 * b * sxy + 2 * c * b * sx
+        fit["r2"] = 1 - max(ss_res, 0.0) / ss_tot
+    den = n * stt - st * st
+    if n >= 2 and den > 1e-9:
+        cs = (n * std - st * sd) / den
+        if cs > 0:
+            fit["cs"], fit["d_prime"] = cs, (sd - cs * st) / n
+    return fit
+
+
+def predict(fit, meters):
+    """Power-law time (s) for `meters`."""
+    return math.exp(fit["ln_scale"] + fit["exponent"] * math.log(meters))
+
+
+def predict_cs(fit, meters):
+    """Critical-speed time (s) for `meters`, None without a fit or below D'."""
+    if fit["cs"] is None or meters <= fit["d_prime"]:
+        return None
+    return (meters - fit["d_prime"]) / fit["cs"]
+
+
+class RaceModel:
+    """Incremental fit: `add` efforts in date order, `fit` the current bests."""
+
+    def __init__(self):
+        self.best = {}
+        self.sums = [0.0] * N_SUMS
+
+    def add(self, dist_type, time, distance):
+        """Take an effort into account; True when it is a new best (the fit changed)."""
+        old = self.best.get(dist_type)
+        if old is not None and time >= old[0]:
+            return False
+        if old is not None:
+            self.sums = [s - p for s, p in zip(self.sums, _point(*old))]
+        self.best[dist_type] = (time, distance)
+        self.sums = [s + p for s, p in zip(self.sums, _point(time, distance))]
+        return True
+
+    def fit(self):
+        return solve(self.sums)
+
+
+def best_fit(prs):
+    """Fit on the current best of each distance (records are sorted by time)."""
+    model = RaceModel()
+    for _, dist_type, t, dist in efforts({k: records[:1] for k, records in prs.items()}):
+        model.add(dist_type, t, dist)
+    return model.fit()
+
+
+def _pace(seconds, meters):
+    p = round(seconds / meters * 1000)
+    return f"{int(p // 60)}:{int(p % 60):02d}/km"
+
+
+def project(fit, targets):
+    """{name: {seconds, formatted, pace, critical_speed_seconds}} for [(name, meters)]."""
+    if fit is None:
+        return {}
+    out = {}
+    for name, meters in targets:
+        t = predict(fit, meters)
+        cs = predict_cs(fit, meters)
+        out[name] = {
+            "seconds": round(t),
+            "formatted": fmt_time(round(t)),
+            "pace": _pace(t, meters),
+            "critical_speed_seconds": round(cs) if cs is not None else None,
+        }
+    return out
+
+
+def describe(fit):
+    """JSON summary of a fit."""
+    if fit is None:
+        return None
+    cs = fit["cs"]
+    return {
+        "exponent": round(fit["exponent"], 4),
+        "r2": round(fit["r2"], 4) if fit["r2"] is not None else None,
+        "points": fit["points"],
+        "critical_speed": None if cs is None else {
+            "speed": round(cs, 3), "pace": _pace(1000 / cs, 1000), "d_prime": round(fit["d_prime"], 1),
+        },
+    }
+
+
+def fit_timeline(prs, targets):
+    """(final fit, [{"date", name: seconds...}]): one row per day where a best improved."""
+    rows = efforts(prs)
+    if not rows:
+        return None, []
+    if np is not None:
+        return _timeline_np(rows, targets)
+    model, out = RaceModel(), []
+    changed = False
+    for i, (d, dist_type, t, dist) in enumerate(rows):
+        changed |= model.add(dist_type, t, dist)
+        if changed and (i + 1 == len(rows) or rows[i + 1][0][:10] != d[:10]):
+            fit = model.fit()
+            out.append({"date": d[:10], **{name: round(predict(fit, m)) for name, m in targets}})
+            changed = False
+    return model.fit(), out
+
+
+def _timeline_np(rows, targets):
+    dates, kinds, t, dist = zip(*rows)
+    types, kind = np.unique(np.array(kinds), return_inverse=True)
+    t, dist = np.array(t), np.array(dist)
+    # new bests per distance; only those positions change the fit
+    new = np.empty((len(types), len(rows)), dtype=bool)
+    for k in range(len(types)):
+        mine = np.where(kind == k, t, np.inf)
+        new[k] = mine < np.concatenate(([np.inf], np.minimum.accumulate(mine)[:-1]))
+    at = np.flatnonzero(new.any(axis=0))
+    sums = np.zeros((N_SUMS, len(at)))
+    for k in range(len(types)):
+        idx = np.maximum.accumulate(np.where(new[k, at], at, -1))
+        has = idx >= 0
+        bt, bd = t[np.maximum(idx, 0)], dist[np.maximum(idx, 0)]
+        x, y = np.log(bd), np.log(bt)
+        for j, v in enumerate((np.ones(len(at)), x, y, x * x, x * y, y * y, bt, bd, bt * bt, bt * bd)):
+            sums[j] += np.where(has, v, 0.0)
+
+    cnt, sx, sy, sxx, sxy = sums[:5]
+    den = cnt * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b = np.clip(np.where((cnt >= 2) & (den > 1e-9), (cnt * sxy - sx * sy) / den, RIEGEL_EXPONENT),
+                    *EXPONENT_RANGE)
+    c = (sy - b * sx) / cnt
+
+    # one row per day: the last improvement of the day
+    days = [dates[i][:10] for i in at.tolist()]
+    keep = [r for r in range(len(days)) if r + 1 == len(days) or days[r + 1] != days[r]]
+    cols = {name: np.rint(np.exp(c[keep] + b[keep] * math.log(m))).astype(np.int64).tolist()
+            for name, m in targets}
+    out = [{"date": days[r], **{name: cols[name][j] for name, _ in targets}} for j, r in enumerate(keep)]
+    return solve(sums[:, -1].tolist()), out
@@ -0,0 +1,107 @@
+"""Encoded polyline decode/encode and Douglas-Peucker levels of detail.
+
+Points are kept as integer 1e-5 degree pairs, exactly as encoded, so a
+simplified line re-encodes without rounding drift. Tolerances are in
+metres and applied in a local equirectangular projection.
+"""
+import math
+
+PRECISION = 1e5
+METERS_PER_DEGREE = 111320.0
+
+# level -> Douglas-Peucker tolerance (m): lod0 for a single run map, lod1 for overviews
+LEVELS = {
+    "lod0": 10.0,
+    "lod1": 50.0,
+}
+
+
+def decode_ints(s):
+    """Encoded polyline -> [(lat, lng)] in 1e-5 degree integers."""
+    points = []
+    index = lat = lng = 0
+    n = len(s)
+    while index < n:
+        for i in range(2):
+            shift = result = 0
+            while True:
+                b = ord(s[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if i == 0:
+                lat += delta
+            else:
+                lng += delta
+        points.append((lat, lng))
+    return points
+
+
+def decode(s):
+    """Encoded polyline -> [(lat, lng)] in degrees."""
+    return [(lat / PRECISION, lng / PRECISION) for lat, lng in decode_ints(s)]
+
+
+def _encode_value(v, out):
+    v = ~(v << 1) if v < 0 else v << 1
+    while v >= 0x20:
+        out.append(chr((0x20 | (v & 0x1f)) + 63))
+        v >>= 5
+    out.append(chr(v + 63))
+
+
+def encode_ints(points):
+    out = []
+    plat = plng = 0
+    for lat, lng in points:
+        _encode_value(lat - plat, out)
+        _encode_value(lng - plng, out)
+        plat, plng = lat, lng
+    return "".join(out)
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker on integer points; `tolerance` in metres."""
+    if len(points) < 3:
+        return list(points)
+    # project to metres around the mean latitude
+    kx = METERS_PER_DEGREE / PRECISION * math.cos(math.radians(sum(p[0] for p in points) / len(points) / PRECISION))
+    ky = METERS_PER_DEGREE / PRECISION
+    xs = [p[1] * kx for p in points]
+    ys = [p[0] * ky for p in points]
+    tol2 = tolerance * tolerance
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg2 = dx * dx + dy * dy
+        best, index = -1.0, -1
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2 == 0:
+                d2 = px * px + py * py
+            else:
+                cross = px * dy - py * dx
+                d2 = cross * cross / seg2
+            if d2 > best:
+                best, index = d2, i
+        if best > tol2:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def levels(encoded):
+    """{level: encoded simplified polyline} for every LEVELS entry."""
+    if not encoded:
+        return {name: "" for name in LEVELS}
+    points = decode_ints(encoded)
+    return {name: encode_ints(simplify(points, tol)) for name, tol in LEVELS.items()}
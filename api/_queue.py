@@ -0,0 +1,75 @@
+"""Targeted single-activity fetches queued by webhook events.
+
+The fetched activity is a full detail, so its best efforts are stored too.
+Deletes are queued the same way and only applied when Strava answers 404,
+and a deauthorization is only applied once Strava rejects the athlete's
+tokens, so a forged event cannot destroy data.
+"""
+import time
+import httpx
+from api._ratelimit import BACKGROUND, RateLimitExceeded
+from api._store import (get_tokens, save_tokens, next_jobs, finish_job, put_activity, put_details,
+                        delete_activity, forget_athlete)
+from api._utils import strava_get
+from api.auth.refresh import refresh_tokens
+
+
+def athlete_token(athlete_id):
+    """Valid access token for a stored athlete (refreshed near expiry), or None."""
+    tokens = get_tokens(athlete_id)
+    if tokens is None:
+        return None
+    if tokens["expires_at"] < time.time() + 60:
+        tokens = refresh_tokens(tokens["refresh_token"])
+        save_tokens(athlete_id, **tokens)
+    return tokens["access_token"]
+
+
+def deauthorize(athlete_id):
+    """Forget the athlete if Strava no longer accepts their tokens; True if forgotten."""
+    if get_tokens(athlete_id) is None:
+        return False
+    try:
+        strava_get(athlete_token(athlete_id), "/athlete", priority=BACKGROUND, timeout=5.0)
+        return False
+    except httpx.HTTPStatusError as e:
+        # 400/401 from the token refresh or the call: the app's access was revoked
+        if e.response.status_code not in (400, 401):
+            return False
+    except (httpx.HTTPError, RateLimitExceeded):
+        return False
+    forget_athlete(athlete_id)
+    return True
+
+
+def process_queue(time_budget=5.0, limit=50):
+    """One pass over pending jobs within `time_budget` seconds; returns jobs completed."""
+    deadline = time.time() + time_budget
+    done = 0
+    for job in next_jobs(limit):
+        if time.time() >= deadline:
+            break
+        try:
+            token = athlete_token(job["athlete_id"])
+            if token is None:
+                finish_job(job["id"])
+                continue
+            activity = strava_get(token, f"/activities/{job['activity_id']}", priority=BACKGROUND)
+            put_activity(job["athlete_id"], activity)
+            if activity.get("type") == "Run":
+                put_details(job["athlete_id"], [activity])
+            finish_job(job["id"])
+            done += 1
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                # deleted or made private before we got to it
+                delete_activity(job["athlete_id"], job["activity_id"])
+                finish_job(job["id"])
+            else:
+                finish_job(job["id"], str(e))
+        except RateLimitExceeded as e:
+            finish_job(job["id"], str(e))
+            break
+        except httpx.HTTPError as e:
+            finish_job(job["id"], str(e))
+    return done
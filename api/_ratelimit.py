@@ -0,0 +1,177 @@
+"""Rate-limit-aware scheduler shared by every Strava call.
+
+Strava enforces a 15-minute and a daily quota per application and reports
+usage in the X-RateLimit-Usage / X-RateLimit-Limit headers ("short,daily").
+Calls go through a token bucket refilled at the 15-minute rate; background
+work only spends the quota above RESERVE and always yields to waiting
+interactive requests. When background calls outnumber the tokens left, the
+athlete with the fewest calls in the current window goes first, so
+concurrent syncs share a scarce budget evenly.
+"""
+import os
+import time
+import threading
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+SHORT_WINDOW = 900
+DAILY_WINDOW = 86400
+SHORT_LIMIT = int(os.environ.get("STRAVA_RATE_SHORT", "200"))
+DAILY_LIMIT = int(os.environ.get("STRAVA_RATE_DAILY", "2000"))
+RESERVE = float(os.environ.get("STRAVA_RATE_RESERVE", "0.2"))
+ATHLETE_SHARE = float(os.environ.get("STRAVA_RATE_ATHLETE_SHARE", "0.5"))
+BURST = int(os.environ.get("STRAVA_RATE_BURST", "100"))
+MAX_RETRIES = 3
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Strava rate limit reached, retry in {int(retry_after)}s")
+        self.retry_after = retry_after
+
+
+def _parse_pair(value):
+    try:
+        short, daily = value.split(",")[:2]
+        return int(short), int(daily)
+    except (AttributeError, ValueError):
+        return None
+
+
+class Scheduler:
+    def __init__(self, short_limit=SHORT_LIMIT, daily_limit=DAILY_LIMIT, burst=BURST):
+        self.cond = threading.Condition()
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.burst = burst
+        self.short_used = 0
+        self.daily_used = 0
+        self.athletes = {}
+        self.waiting = [0, 0]
+        self.waiting_keys = {}
+        now = time.time()
+        self.short_window = int(now // SHORT_WINDOW)
+        self.daily_window = int(now // DAILY_WINDOW)
+        self.tokens = float(burst)
+        self.refilled_at = now
+
+    def _roll(self, now):
+        if int(now // SHORT_WINDOW) != self.short_window:
+            self.short_window = int(now // SHORT_WINDOW)
+            self.short_used = 0
+            self.athletes = {}
+        if int(now // DAILY_WINDOW) != self.daily_window:
+            self.daily_window = int(now // DAILY_WINDOW)
+            self.daily_used = 0
+        rate = self.short_limit / SHORT_WINDOW
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+
+    def _wait_time(self, key, priority, now):
+        """Seconds until a call of this priority may go out (0 = now)."""
+        reserve = RESERVE if priority == BACKGROUND else 0
+        if self.daily_used >= self.daily_limit * (1 - reserve):
+            return (self.daily_window + 1) * DAILY_WINDOW - now
+        if self.short_used >= self.short_limit * (1 - reserve):
+            return (self.short_window + 1) * SHORT_WINDOW - now
+        if key is not None and self.athletes.get(key, 0) >= self.short_limit * ATHLETE_SHARE:
+            return (self.short_window + 1) * SHORT_WINDOW - now
+        if priority == BACKGROUND and self.waiting[INTERACTIVE]:
+            return 0.05
+        if self.tokens < 1:
+            return (1 - self.tokens) * SHORT_WINDOW / self.short_limit
+        if priority == BACKGROUND and key is not None and self.tokens < self.waiting[BACKGROUND] \
+                and self._behind(key):
+            return 0.05
+        return 0
+
+    def _behind(self, key):
+        """True if another waiting background athlete has made fewer calls in this window."""
+        used = self.athletes.get(key, 0)
+        return any(self.athletes.get(k, 0) < used for k in self.waiting_keys)
+
+    def acquire(self, key=None, priority=INTERACTIVE, timeout=None):
+        """Block until a call may be made; raise RateLimitExceeded past `timeout` (0 = only a free slot)."""
+        if timeout is None:
+            timeout = 10.0 if priority == INTERACTIVE else 30.0
+        deadline = time.time() + timeout
+        fair = priority == BACKGROUND and key is not None
+        with self.cond:
+            self.waiting[priority] += 1
+            if fair:
+                self.waiting_keys[key] = self.waiting_keys.get(key, 0) + 1
+            try:
+                while True:
+                    now = time.time()
+                    self._roll(now)
+                    wait = self._wait_time(key, priority, now)
+                    if wait <= 0:
+                        self.tokens -= 1
+                        self.short_used += 1
+                        self.daily_used += 1
+                        if key is not None:
+                            self.athletes[key] = self.athletes.get(key, 0) + 1
+                        return
+                    if now + wait > deadline:
+                        raise RateLimitExceeded(wait)
+                    self.cond.wait(wait)
+            finally:
+                self.waiting[priority] -= 1
+                if fair:
+                    self.waiting_keys[key] -= 1
+                    if not self.waiting_keys[key]:
+                        del self.waiting_keys[key]
+                self.cond.notify_all()
+
+    def update(self, headers):
+        """Adopt Strava's view of the quota from response headers."""
+        limit = _parse_pair(headers.get("X-RateLimit-Limit"))
+        usage = _parse_pair(headers.get("X-RateLimit-Usage"))
+        with self.cond:
+            if limit:
+                self.short_limit, self.daily_limit = limit
+            if usage:
+                self.short_used, self.daily_used = usage
+            self.cond.notify_all()
+
+    def backoff(self, headers, attempt):
+        """Sleep before retrying a 429 response."""
+        retry_after = headers.get("Retry-After")
+        delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+        time.sleep(min(delay, 30.0))
+
+    def budget(self, key=None):
+        with self.cond:
+            now = time.time()
+            self._roll(now)
+            out = {
+                "tokens": int(self.tokens),
+                "short": {
+                    "limit": self.short_limit,
+                    "used": self.short_used,
+                    "remaining": max(0, self.short_limit - self.short_used),
+                    "reset_in": int((self.short_window + 1) * SHORT_WINDOW - now),
+                },
+                "daily": {
+                    "limit": self.daily_limit,
+                    "used": self.daily_used,
+                    "remaining": max(0, self.daily_limit - self.daily_used),
+                    "reset_in": int((self.daily_window + 1) * DAILY_WINDOW - now),
+                },
+            }
+            if key is not None:
+                used = self.athletes.get(key, 0)
+                out["athlete"] = {
+                    "used": used,
+                    "remaining": max(0, int(self.short_limit * ATHLETE_SHARE) - used),
+                }
+            return out
+
+
+scheduler = Scheduler()
+
+
+def budget(key=None):
+    """Current app (and optionally athlete) quota snapshot."""
+    return scheduler.budget(key)
@@ -0,0 +1,160 @@
+"""Shared JSON response writer: strong ETags, 304s, compression and cache headers.
+
+Bodies are serialized with orjson when it is installed (stdlib json
+otherwise) and written as one bytes object with Content-Length. Constant
+header lines (CORS, content type, cache policy) are encoded once and
+appended to the handler's header buffer as a block.
+"""
+import os
+import gzip
+import json
+import hashlib
+from datetime import date
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler
+from api._timing import phase
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# responses are per athlete (bearer token): shared caching is opt-in and only
+# safe behind a CDN that keys its cache on Authorization
+CDN_MAX_AGE = int(os.environ.get("CDN_MAX_AGE", "0"))
+MIN_COMPRESS = 1024
+
+
+def dumps(data):
+    """Compact JSON bytes (non-string keys and unknown types fall back to str)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+
+def _block(*pairs):
+    return "".join(f"{k}: {v}\r\n" for k, v in pairs).encode("latin-1")
+
+
+@lru_cache(maxsize=None)
+def cors_block(methods):
+    return _block(
+        ("Access-Control-Allow-Origin", "*"),
+        ("Access-Control-Allow-Methods", methods),
+        ("Access-Control-Allow-Headers", "Content-Type, Authorization, If-None-Match"),
+        ("Access-Control-Expose-Headers", "ETag, Server-Timing"),
+    )
+
+
+JSON_TYPE = _block(("Content-Type", "application/json"))
+CACHE = _block(
+    ("Cache-Control", "private, max-age=0, must-revalidate" if not CDN_MAX_AGE
+     else f"max-age=0, s-maxage={CDN_MAX_AGE}, stale-while-revalidate={CDN_MAX_AGE * 5}"),
+    ("Vary", "Authorization, Accept-Encoding"),
+)
+NO_STORE = _block(("Cache-Control", "no-store"), ("Vary", "Accept-Encoding"))
+CONTENT_ENCODING = {"gzip": _block(("Content-Encoding", "gzip")), "br": _block(("Content-Encoding", "br"))}
+
+
+def send_block(handler, block):
+    """Append pre-encoded header lines after send_response (same as send_header per line)."""
+    if handler.request_version != "HTTP/0.9":
+        handler._headers_buffer.append(block)
+
+
+def request_etag(handler, *parts):
+    """ETag for this request: data version parts + query + day (date windows move daily)."""
+    raw = ":".join(str(p) for p in (*parts, date.today().isoformat(), handler.path))
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def choose_encoding(accept):
+    """Best supported Content-Encoding from an Accept-Encoding header (or None)."""
+    accepted = set()
+    for part in (accept or "").split(","):
+        name, _, param = part.partition(";")
+        key, _, q = param.strip().partition("=")
+        if key == "q":
+            try:
+                if float(q) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        # mtime=0: identical bytes for an identical body, as the strong ETag promises
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def _cache_headers(handler, etag, encoding):
+    # strong ETags must differ per representation, hence the encoding suffix
+    handler.send_header("ETag", f'"{etag}-{encoding}"' if encoding else f'"{etag}"')
+    send_block(handler, CACHE)
+
+
+def not_modified(handler, etag, methods="GET, OPTIONS"):
+    """Answer 304 if If-None-Match carries this ETag (any encoding). Returns True if sent."""
+    inm = handler.headers.get("If-None-Match")
+    if not inm:
+        return False
+    tags = {t.strip().removeprefix("W/").strip('"').split("-")[0] for t in inm.split(",")}
+    if etag not in tags and "*" not in tags:
+        return False
+    encoding = choose_encoding(handler.headers.get("Accept-Encoding"))
+    handler.send_response(304)
+    send_block(handler, cors_block(methods))
+    _cache_headers(handler, etag, encoding)
+    handler.end_headers()
+    return True
+
+
+def send_json(handler, data, status=200, etag=None, methods="GET, OPTIONS"):
+    with phase("serialize"):
+        body = dumps(data)
+        encoding = None
+        if len(body) >= MIN_COMPRESS:
+            encoding = choose_encoding(handler.headers.get("Accept-Encoding"))
+            body = compress(body, encoding)
+
+    handler.send_response(status)
+    send_block(handler, cors_block(methods))
+    send_block(handler, JSON_TYPE)
+    handler.send_header("Content-Length", str(len(body)))
+    if encoding:
+        send_block(handler, CONTENT_ENCODING[encoding])
+    if etag and status == 200:
+        _cache_headers(handler, etag, encoding)
+    else:
+        send_block(handler, NO_STORE)
+    handler.end_headers()
+    with phase("write"):
+        handler.wfile.write(body)
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Base of the JSON endpoints: CORS preflight and `_json` replies for `methods`."""
+    methods = "GET, OPTIONS"
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        send_block(self, cors_block(self.methods))
+        self.end_headers()
+
+    def _json(self, data, status=200, etag=None):
+        send_json(self, data, status, etag, self.methods)
@@ -0,0 +1,740 @@
+"""Persistent activity store (SQLite locally, Turso/libsql when configured)."""
+import os
+import json
+import time
+import base64
+import hashlib
+import shutil
+import sqlite3
+import threading
+from datetime import date, datetime
+import httpx
+from api import _aggregates, _polyline
+from api._frame import from_day
+from api._ratelimit import INTERACTIVE, RateLimitExceeded
+from api._timing import phase, warn
+from api._utils import strava_get, iter_pages
+
+DB_PATH = os.environ.get("SQLITE_PATH", "/tmp/strava.db")
+# unpacked per-second streams, memory-mapped by api/_streams.py
+STREAM_DIR = os.environ.get("STREAM_DIR", "/tmp/streams")
+SYNC_INTERVAL = int(os.environ.get("SYNC_INTERVAL", "60"))
+PER_PAGE = 200
+# best effort fields kept from an activity detail (the rest is never read)
+DETAIL_EFFORT_FIELDS = ("name", "distance", "elapsed_time", "moving_time", "start_date_local")
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS activities (
+        athlete_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        type TEXT,
+        start_date_local TEXT,
+        data TEXT NOT NULL,
+        PRIMARY KEY (athlete_id, id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_activities_date ON activities (athlete_id, start_date_local)",
+    """CREATE TABLE IF NOT EXISTS sync_state (
+        athlete_id INTEGER PRIMARY KEY,
+        high_water INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0,
+        synced_at REAL NOT NULL DEFAULT 0,
+        cursor TEXT,
+        aggregated INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS segments (
+        athlete_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (athlete_id, id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS athletes (
+        athlete_id INTEGER PRIMARY KEY,
+        access_token TEXT NOT NULL,
+        refresh_token TEXT NOT NULL,
+        expires_at INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS sync_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        athlete_id INTEGER NOT NULL,
+        activity_id INTEGER NOT NULL,
+        enqueued_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS agg_buckets (
+        athlete_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        key INTEGER NOT NULL,
+        runs INTEGER NOT NULL,
+        distance REAL NOT NULL,
+        moving_time REAL NOT NULL,
+        elev REAL NOT NULL,
+        ma_4w REAL,
+        PRIMARY KEY (athlete_id, period, key)
+    )""",
+    """CREATE TABLE IF NOT EXISTS pr_index (
+        athlete_id INTEGER NOT NULL,
+        dist_type TEXT NOT NULL,
+        activity_id INTEGER NOT NULL,
+        time REAL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (athlete_id, dist_type, activity_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_pr_time ON pr_index (athlete_id, dist_type, time)",
+    """CREATE TABLE IF NOT EXISTS load_state (
+        athlete_id INTEGER PRIMARY KEY,
+        day INTEGER NOT NULL,
+        atl REAL NOT NULL,
+        ctl REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS polylines (
+        athlete_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (athlete_id, id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS activity_details (
+        athlete_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (athlete_id, id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS streams (
+        athlete_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        metrics TEXT,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (athlete_id, id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS results (
+        athlete_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        version TEXT NOT NULL,
+        data TEXT NOT NULL,
+        computed_at REAL NOT NULL,
+        PRIMARY KEY (athlete_id, key)
+    )""",
+    """CREATE TABLE IF NOT EXISTS tokens (
+        token_hash TEXT PRIMARY KEY,
+        athlete_id INTEGER NOT NULL,
+        seen_at REAL NOT NULL
+    )""",
+]
+
+# columns added after the first release; failures mean they already exist
+MIGRATIONS = [
+    "ALTER TABLE sync_state ADD COLUMN cursor TEXT",
+    "ALTER TABLE sync_state ADD COLUMN aggregated INTEGER NOT NULL DEFAULT 0",
+]
+
+_conn = None
+_lock = threading.RLock()
+
+
+def connect():
+    """Open the database: libsql embedded replica if Turso is configured, else SQLite."""
+    url = os.environ.get("TURSO_DATABASE_URL")
+    if url:
+        try:
+            import libsql_experimental as libsql
+            conn = libsql.connect(DB_PATH, sync_url=url, auth_token=os.environ.get("TURSO_AUTH_TOKEN", ""))
+            conn.sync()
+            return conn
+        except ImportError:
+            pass
+    return sqlite3.connect(DB_PATH, check_same_thread=False)
+
+
+def db():
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = connect()
+            for stmt in SCHEMA:
+                _conn.execute(stmt)
+            for stmt in MIGRATIONS:
+                try:
+                    _conn.execute(stmt)
+                except Exception:
+                    pass
+            _conn.commit()
+        return _conn
+
+
+def commit():
+    conn = db()
+    conn.commit()
+    if hasattr(conn, "sync"):
+        conn.sync()
+
+
+def epoch(iso):
+    """Epoch seconds of a Strava UTC timestamp ("2024-01-01T08:00:00Z")."""
+    if not iso:
+        return 0
+    return int(datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp())
+
+
+def athlete_for_token(token):
+    """Resolve (and remember) the athlete owning an access token."""
+    h = hashlib.sha256(token.encode()).hexdigest()
+    with _lock:
+        row = db().execute("SELECT athlete_id FROM tokens WHERE token_hash = ?", (h,)).fetchone()
+    if row:
+        return row[0]
+    athlete_id = strava_get(token, "/athlete")["id"]
+    remember_token(token, athlete_id)
+    return athlete_id
+
+
+def remember_token(token, athlete_id):
+    with _lock:
+        db().execute(
+            "INSERT OR REPLACE INTO tokens (token_hash, athlete_id, seen_at) VALUES (?, ?, ?)",
+            (hashlib.sha256(token.encode()).hexdigest(), athlete_id, time.time()),
+        )
+        commit()
+
+
+def save_tokens(athlete_id, access_token, refresh_token, expires_at):
+    """Keep an athlete's OAuth tokens for server-side (webhook/cron) syncs."""
+    with _lock:
+        db().execute(
+            "INSERT OR REPLACE INTO athletes (athlete_id, access_token, refresh_token, expires_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (athlete_id, access_token, refresh_token, int(expires_at), time.time()),
+        )
+        commit()
+    remember_token(access_token, athlete_id)
+
+
+def list_athletes():
+    """Athletes with stored tokens, least recently synced first."""
+    with _lock:
+        rows = db().execute(
+            "SELECT a.athlete_id FROM athletes a LEFT JOIN sync_state s ON s.athlete_id = a.athlete_id "
+            "ORDER BY COALESCE(s.synced_at, 0)"
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def rotate_tokens(old_refresh_token, access_token, refresh_token, expires_at):
+    """Record a client-side refresh; returns the athlete_id, or None if unknown."""
+    with _lock:
+        row = db().execute(
+            "SELECT athlete_id FROM athletes WHERE refresh_token = ?", (old_refresh_token,)
+        ).fetchone()
+    if not row:
+        return None
+    save_tokens(row[0], access_token, refresh_token, expires_at)
+    return row[0]
+
+
+def get_tokens(athlete_id):
+    with _lock:
+        row = db().execute(
+            "SELECT access_token, refresh_token, expires_at FROM athletes WHERE athlete_id = ?", (athlete_id,)
+        ).fetchone()
+    if not row:
+        return None
+    return {"access_token": row[0], "refresh_token": row[1], "expires_at": row[2]}
+
+
+def get_state(athlete_id):
+    with _lock:
+        row = db().execute(
+            "SELECT high_water, version, synced_at, cursor FROM sync_state WHERE athlete_id = ?", (athlete_id,)
+        ).fetchone()
+    if not row:
+        return {"high_water": 0, "version": 0, "synced_at": 0, "cursor": None}
+    return {"high_water": row[0], "version": row[1], "synced_at": row[2], "cursor": row[3]}
+
+
+def bump_version(athlete_id):
+    with _lock:
+        db().execute(
+            "INSERT INTO sync_state (athlete_id, version) VALUES (?, 1) "
+            "ON CONFLICT(athlete_id) DO UPDATE SET version = sync_state.version + 1",
+            (athlete_id,),
+        )
+        commit()
+
+
+def encode_cursor(c):
+    return base64.urlsafe_b64encode(json.dumps(c, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; ValueError if the cursor was not produced by it."""
+    try:
+        c = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if all(isinstance(c[k], int) for k in ("after", "page", "newest", "count")):
+            return c
+    except (ValueError, TypeError, KeyError):
+        pass
+    raise ValueError("invalid cursor")
+
+
+def data_version(athlete_id):
+    """Counter bumped whenever the athlete's stored activities change."""
+    return get_state(athlete_id)["version"]
+
+
+def upsert_activities(athlete_id, activities):
+    """Insert or replace activity summaries; returns the newest start epoch seen."""
+    newest = 0
+    rows = []
+    for a in activities:
+        newest = max(newest, epoch(a.get("start_date")))
+        rows.append((athlete_id, a["id"], a.get("type"), a.get("start_date_local", ""), json.dumps(a)))
+    if rows:
+        with _lock:
+            if _aggregated(athlete_id):
+                latest = {a["id"]: a for a in activities}
+                old = _stored(athlete_id, list(latest))
+                _aggregates.apply_delta(db(), athlete_id, old, list(latest.values()))
+            db().executemany(
+                "INSERT OR REPLACE INTO activities (athlete_id, id, type, start_date_local, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+    return newest
+
+
+def _stored(athlete_id, ids):
+    """Stored versions of the given activity ids."""
+    out = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = db().execute(
+            f"SELECT data FROM activities WHERE athlete_id = ? AND id IN ({','.join('?' * len(chunk))})",
+            (athlete_id, *chunk),
+        ).fetchall()
+        out.extend(json.loads(r[0]) for r in rows)
+    return out
+
+
+def _save_state(athlete_id, high_water, bump, synced_at=None, cursor=None):
+    with _lock:
+        db().execute(
+            "INSERT INTO sync_state (athlete_id, high_water, version, synced_at, cursor) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(athlete_id) DO UPDATE SET high_water = excluded.high_water, "
+            "version = sync_state.version + ?, synced_at = COALESCE(?, sync_state.synced_at), "
+            "cursor = excluded.cursor",
+            (athlete_id, high_water, bump, synced_at or 0, cursor, bump, synced_at),
+        )
+        commit()
+
+
+def sync_step(token, athlete_id, cursor=None, max_pages=None, time_budget=None,
+              priority=INTERACTIVE, on_page=None):
+    """Advance a resumable sync by at most `max_pages` pages / `time_budget` seconds.
+
+    Without an explicit cursor the step resumes from the one stored for the
+    athlete. Pages are requested with `after` (ascending order), so page
+    numbers stay stable while new activities are appended. Every stored page
+    persists the cursor, so an interrupted step loses nothing. Returns
+    {"complete", "cursor", "pages", "count"}; cursor is None once complete.
+    """
+    state = get_state(athlete_id)
+    if cursor is None:
+        cursor = state["cursor"]
+    c = decode_cursor(cursor) if cursor else {
+        "after": state["high_water"], "page": 1, "newest": state["high_water"], "count": 0,
+    }
+    deadline = time.time() + time_budget if time_budget else None
+
+    pages, complete = 0, True
+    gen = iter_pages(token, "/athlete/activities", {"after": c["after"]}, PER_PAGE,
+                     priority=priority, start=c["page"])
+    try:
+        for batch in gen:
+            c["newest"] = max(c["newest"], upsert_activities(athlete_id, batch))
+            c["page"] += 1
+            c["count"] += len(batch)
+            pages += 1
+            _save_state(athlete_id, state["high_water"], 1, cursor=encode_cursor(c))
+            if on_page:
+                on_page(batch)
+            if (max_pages and pages >= max_pages) or (deadline and time.time() >= deadline):
+                complete = False
+                break
+    finally:
+        gen.close()
+
+    if complete:
+        _save_state(athlete_id, max(c["newest"], get_state(athlete_id)["high_water"]), 0, synced_at=time.time())
+        return {"complete": True, "cursor": None, "pages": pages, "count": c["count"]}
+    return {"complete": False, "cursor": encode_cursor(c), "pages": pages, "count": c["count"]}
+
+
+def needs_sync(athlete_id):
+    state = get_state(athlete_id)
+    return state["cursor"] is not None or time.time() - state["synced_at"] >= SYNC_INTERVAL
+
+
+def _transient(e):
+    """Rate limit, timeout or Strava-side error: worth serving stored data instead."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, (RateLimitExceeded, httpx.TransportError))
+
+
+def has_activities(athlete_id):
+    with _lock:
+        return db().execute("SELECT 1 FROM activities WHERE athlete_id = ? LIMIT 1", (athlete_id,)).fetchone() \
+            is not None
+
+
+def sync(token, force=False, priority=INTERACTIVE):
+    """Pull activities newer than the stored high-water mark. Returns athlete_id.
+
+    A transient failure (rate limit, timeout, Strava 5xx) is logged and the
+    stored activities are served as they are, the high-water mark unchanged;
+    it is only raised while nothing is stored yet.
+    """
+    with phase("auth"):
+        athlete_id = athlete_for_token(token)
+    with phase("sync"):
+        if force or needs_sync(athlete_id):
+            try:
+                sync_step(token, athlete_id, priority=priority)
+            except Exception as e:
+                if not _transient(e) or not has_activities(athlete_id):
+                    raise
+                warn(f"sync of athlete {athlete_id} failed, serving stored activities: {e}")
+    return athlete_id
+
+
+def put_activity(athlete_id, activity):
+    """Store one activity pushed by a webhook or fetched on demand."""
+    upsert_activities(athlete_id, [activity])
+    bump_version(athlete_id)
+
+
+def patch_activity(athlete_id, activity_id, fields):
+    """Apply summary field changes in place; False if the activity is not stored."""
+    with _lock:
+        row = db().execute(
+            "SELECT data FROM activities WHERE athlete_id = ? AND id = ?", (athlete_id, activity_id)
+        ).fetchone()
+    if not row:
+        return False
+    activity = json.loads(row[0])
+    activity.update(fields)
+    put_activity(athlete_id, activity)
+    return True
+
+
+def delete_activity(athlete_id, activity_id):
+    with _lock:
+        if _aggregated(athlete_id):
+            _aggregates.apply_delta(db(), athlete_id, _stored(athlete_id, [activity_id]), [])
+        db().execute("DELETE FROM activities WHERE athlete_id = ? AND id = ?", (athlete_id, activity_id))
+        db().execute("DELETE FROM activity_details WHERE athlete_id = ? AND id = ?", (athlete_id, activity_id))
+        db().execute("DELETE FROM streams WHERE athlete_id = ? AND id = ?", (athlete_id, activity_id))
+        try:
+            os.remove(stream_path(athlete_id, activity_id))
+        except FileNotFoundError:
+            pass
+    bump_version(athlete_id)
+
+
+def forget_athlete(athlete_id):
+    """Drop everything stored for an athlete (deauthorization)."""
+    with _lock:
+        for table in ("activities", "segments", "sync_state", "athletes", "tokens", "sync_queue", "results",
+                      "agg_buckets", "pr_index", "load_state", "polylines", "activity_details",
+                      "streams"):
+            db().execute(f"DELETE FROM {table} WHERE athlete_id = ?", (athlete_id,))
+        commit()
+        shutil.rmtree(os.path.join(STREAM_DIR, str(int(athlete_id))), ignore_errors=True)
+
+
+def enqueue_fetch(athlete_id, activity_id):
+    with _lock:
+        db().execute(
+            "INSERT INTO sync_queue (athlete_id, activity_id, enqueued_at) VALUES (?, ?, ?)",
+            (athlete_id, activity_id, time.time()),
+        )
+        commit()
+
+
+def next_jobs(limit=20, max_attempts=5):
+    with _lock:
+        rows = db().execute(
+            "SELECT id, athlete_id, activity_id, attempts FROM sync_queue WHERE attempts < ? "
+            "ORDER BY enqueued_at LIMIT ?",
+            (max_attempts, limit),
+        ).fetchall()
+    return [{"id": r[0], "athlete_id": r[1], "activity_id": r[2], "attempts": r[3]} for r in rows]
+
+
+def finish_job(job_id, error=None):
+    with _lock:
+        if error is None:
+            db().execute("DELETE FROM sync_queue WHERE id = ?", (job_id,))
+        else:
+            db().execute(
+                "UPDATE sync_queue SET attempts = attempts + 1, last_error = ? WHERE id = ?", (error, job_id)
+            )
+        commit()
+
+
+def result_version(athlete_id):
+    """Precomputed results are valid for one data version on one day."""
+    return f"{data_version(athlete_id)}:{date.today().isoformat()}"
+
+
+def get_result(athlete_id, key):
+    """Precomputed result for `key` if still current, else None."""
+    with _lock:
+        row = db().execute(
+            "SELECT version, data FROM results WHERE athlete_id = ? AND key = ?", (athlete_id, key)
+        ).fetchone()
+    if not row or row[0] != result_version(athlete_id):
+        return None
+    return json.loads(row[1])
+
+
+def put_results(athlete_id, results, version):
+    now = time.time()
+    with _lock:
+        db().executemany(
+            "INSERT OR REPLACE INTO results (athlete_id, key, version, data, computed_at) VALUES (?, ?, ?, ?, ?)",
+            [(athlete_id, key, version, json.dumps(data), now) for key, data in results.items()],
+        )
+        commit()
+
+
+def load_runs(athlete_id, lo=None, hi=None):
+    """Stored running activities, oldest first; lo/hi bound the epoch day (inclusive).
+
+    The range is a seek on idx_activities_date, so only its rows are read.
+    """
+    sql = "SELECT data FROM activities WHERE athlete_id = ? AND type = 'Run'"
+    args = [athlete_id]
+    if lo is not None:
+        sql += " AND start_date_local >= ?"
+        args.append(from_day(lo).isoformat())
+    if hi is not None:
+        sql += " AND start_date_local < ?"
+        args.append(from_day(hi + 1).isoformat())
+    with _lock:
+        rows = db().execute(sql + " ORDER BY start_date_local", args).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def _aggregated(athlete_id):
+    row = db().execute("SELECT aggregated FROM sync_state WHERE athlete_id = ?", (athlete_id,)).fetchone()
+    return bool(row and row[0] >= _aggregates.VERSION)
+
+
+def _ensure_aggregates(athlete_id):
+    """Build the aggregate tables on first read; later writes keep them current."""
+    if _aggregated(athlete_id):
+        return
+    _aggregates.rebuild(db(), athlete_id, load_runs(athlete_id))
+    db().execute(
+        "INSERT INTO sync_state (athlete_id, aggregated) VALUES (?, ?) "
+        "ON CONFLICT(athlete_id) DO UPDATE SET aggregated = excluded.aggregated",
+        (athlete_id, _aggregates.VERSION),
+    )
+    commit()
+
+
+def load_buckets(athlete_id, period):
+    """Weekly/monthly/yearly totals from the aggregate tables (O(buckets))."""
+    with _lock:
+        _ensure_aggregates(athlete_id)
+        return _aggregates.read_buckets(db(), athlete_id, period)
+
+
+def load_prs(athlete_id, lo=None, hi=None):
+    """PRs from the index; lo/hi keep the records dated in that day range, ranked among themselves."""
+    with _lock:
+        _ensure_aggregates(athlete_id)
+        return _aggregates.read_prs(db(), athlete_id, lo, hi)
+
+
+def load_training(athlete_id):
+    """Training-load filter state (ATL/CTL at the last run day) from the aggregate tables."""
+    with _lock:
+        _ensure_aggregates(athlete_id)
+        return _aggregates.read_load(db(), athlete_id)
+
+
+def check_aggregates(athlete_id):
+    """Compare the aggregate tables with a full recompute; returns the differences."""
+    with _lock:
+        _ensure_aggregates(athlete_id)
+        return _aggregates.check(db(), athlete_id, load_runs(athlete_id))
+
+
+def load_activities(token):
+    """Sync then read all running activities for the token's athlete."""
+    return load_runs(sync(token))
+
+
+def polyline_levels(athlete_id, activities):
+    """{activity_id: {level: encoded}} for the activities' summary polylines.
+
+    Levels are computed once per polyline and cached; a changed polyline
+    (hash mismatch) is recomputed.
+    """
+    wanted = {}
+    for a in activities:
+        raw = (a.get("map") or {}).get("summary_polyline") or ""
+        wanted[a["id"]] = (raw, hashlib.sha1(raw.encode()).hexdigest()[:16])
+    out, missing = {}, []
+    ids = list(wanted)
+    with _lock:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = db().execute(
+                f"SELECT id, source, data FROM polylines WHERE athlete_id = ? "
+                f"AND id IN ({','.join('?' * len(chunk))})",
+                (athlete_id, *chunk),
+            ).fetchall()
+            for aid, source, data in rows:
+                if wanted[aid][1] == source:
+                    out[aid] = json.loads(data)
+    for aid, (raw, source) in wanted.items():
+        if aid not in out:
+            out[aid] = _polyline.levels(raw)
+            missing.append((athlete_id, aid, source, json.dumps(out[aid])))
+    if missing:
+        with _lock:
+            db().executemany(
+                "INSERT OR REPLACE INTO polylines (athlete_id, id, source, data) VALUES (?, ?, ?, ?)", missing
+            )
+            commit()
+    return out
+
+
+def missing_details(athlete_id, limit=None):
+    """Ids of stored runs whose details were never fetched, newest first."""
+    with _lock:
+        rows = db().execute(
+            "SELECT a.id FROM activities a LEFT JOIN activity_details d "
+            "ON d.athlete_id = a.athlete_id AND d.id = a.id "
+            "WHERE a.athlete_id = ? AND a.type = 'Run' AND d.id IS NULL "
+            "ORDER BY a.start_date_local DESC LIMIT ?",
+            (athlete_id, -1 if limit is None else limit),
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def put_details(athlete_id, details):
+    """Keep the best efforts of fetched activity details and update the PR index."""
+    if not details:
+        return
+    now = time.time()
+    rows = [(athlete_id, d["id"], json.dumps({"best_efforts": [
+        {k: e.get(k) for k in DETAIL_EFFORT_FIELDS} for e in d.get("best_efforts") or []
+    ]}), now) for d in details]
+    with _lock:
+        db().executemany(
+            "INSERT OR REPLACE INTO activity_details (athlete_id, id, data, fetched_at) VALUES (?, ?, ?, ?)", rows
+        )
+        if _aggregated(athlete_id):
+            _aggregates.apply_details(db(), athlete_id, _stored(athlete_id, [d["id"] for d in details]))
+        commit()
+    bump_version(athlete_id)
+
+
+def _in_chunks(sql, athlete_id, ids):
+    """Rows of `sql` (filtered by athlete) for ids, 500 ids per query."""
+    ids, rows = list(ids), []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows += db().execute(f"{sql} AND id IN ({','.join('?' * len(chunk))})", (athlete_id, *chunk)).fetchall()
+    return rows
+
+
+def stream_path(athlete_id, activity_id):
+    return os.path.join(STREAM_DIR, str(int(athlete_id)), f"{int(activity_id)}.bin")
+
+
+def stream_ids(athlete_id, ids):
+    """The subset of `ids` whose streams are stored."""
+    with _lock:
+        return {r[0] for r in _in_chunks("SELECT id FROM streams WHERE athlete_id = ?", athlete_id, ids)}
+
+
+def put_streams(athlete_id, rows):
+    """Store packed, compressed streams: rows of (activity_id, blob, metrics)."""
+    if not rows:
+        return
+    now = time.time()
+    with _lock:
+        db().executemany(
+            "INSERT OR REPLACE INTO streams (athlete_id, id, data, metrics, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            [(athlete_id, aid, blob, json.dumps(m), now) for aid, blob, m in rows],
+        )
+        commit()
+    bump_version(athlete_id)
+
+
+def get_stream(athlete_id, activity_id):
+    with _lock:
+        row = db().execute(
+            "SELECT data FROM streams WHERE athlete_id = ? AND id = ?", (athlete_id, activity_id)
+        ).fetchone()
+    return bytes(row[0]) if row else None
+
+
+def stream_metrics(athlete_id, ids):
+    """Cached per-activity stream metrics: {activity_id: metrics}."""
+    with _lock:
+        rows = _in_chunks("SELECT id, metrics FROM streams WHERE athlete_id = ?", athlete_id, ids)
+    return {aid: json.loads(m) for aid, m in rows if m}
+
+
+def put_stream_metrics(athlete_id, metrics):
+    with _lock:
+        db().executemany(
+            "UPDATE streams SET metrics = ? WHERE athlete_id = ? AND id = ?",
+            [(json.dumps(m), athlete_id, aid) for aid, m in metrics.items()],
+        )
+        commit()
+
+
+def get_segments(athlete_id, ids=None):
+    """Cached segment details: {segment_id: (detail, fetched_at)} (every cached segment without ids)."""
+    if ids is None:
+        with _lock:
+            rows = db().execute(
+                "SELECT id, data, fetched_at FROM segments WHERE athlete_id = ?", (athlete_id,)
+            ).fetchall()
+        return {sid: (json.loads(data), fetched_at) for sid, data, fetched_at in rows}
+    if not ids:
+        return {}
+    out = {}
+    ids = list(ids)
+    with _lock:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = db().execute(
+                f"SELECT id, data, fetched_at FROM segments WHERE athlete_id = ? "
+                f"AND id IN ({','.join('?' * len(chunk))})",
+                (athlete_id, *chunk),
+            ).fetchall()
+            for sid, data, fetched_at in rows:
+                out[sid] = (json.loads(data), fetched_at)
+    return out
+
+
+def put_segments(athlete_id, details):
+    now = time.time()
+    with _lock:
+        db().executemany(
+            "INSERT OR REPLACE INTO segments (athlete_id, id, data, fetched_at) VALUES (?, ?, ?, ?)",
+            [(athlete_id, d["id"], json.dumps(d), now) for d in details],
+        )
+        commit()
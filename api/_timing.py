@@ -0,0 +1,184 @@
+"""Per-request phase timing: Server-Timing header, one JSON log line, optional cProfile.
+
+Handlers wrap do_GET/do_POST with `@instrumented`; code on the request path
+times its work with `with phase("fetch"):` (or `add_phase` for a measured
+duration) and Strava calls are counted by `record_strava`. Phases may nest
+(e.g. frame/prs inside compute) and are reported as measured. `warn` adds a
+message to the log line (or writes it to stderr outside a request).
+
+REQUEST_LOG=0 disables the log line. PROFILE_SAMPLE (0..1) profiles that
+fraction of requests with cProfile; profiles of requests slower than
+PROFILE_SLOW_MS are written to PROFILE_DIR and named in the log line.
+"""
+import os
+import sys
+import json
+import time
+import random
+import cProfile
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+REQUEST_LOG = os.environ.get("REQUEST_LOG", "1") != "0"
+PROFILE_SAMPLE = float(os.environ.get("PROFILE_SAMPLE", "0"))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/profiles")
+
+_current = contextvars.ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.status = None
+        self.phases = {}
+        self.strava = {"calls": 0, "bytes": 0, "ms": 0.0}
+        self.warnings = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, ms):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def strava_call(self, nbytes, ms):
+        with self._lock:
+            self.strava["calls"] += 1
+            self.strava["bytes"] += nbytes
+            self.strava["ms"] += ms
+
+    def elapsed(self):
+        return (time.perf_counter() - self._t0) * 1000
+
+    def header(self):
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.phases.items()]
+        if self.strava["calls"]:
+            parts.append(f'strava;desc="{self.strava["calls"]} calls {self.strava["bytes"]} B";'
+                         f'dur={self.strava["ms"]:.1f}')
+        parts.append(f"total;dur={self.elapsed():.1f}")
+        return ", ".join(parts)
+
+    def record(self, profile=None):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "ms": round(self.elapsed(), 2),
+            "phases": {k: round(v, 2) for k, v in self.phases.items()},
+            "strava_calls": self.strava["calls"],
+            "strava_bytes": self.strava["bytes"],
+            "strava_ms": round(self.strava["ms"], 2),
+            **({"warnings": self.warnings} if self.warnings else {}),
+            **({"profile": profile} if profile else {}),
+        }
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Time a block under `name` for the current request (no-op outside one)."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, (time.perf_counter() - t0) * 1000)
+
+
+def add_phase(name, ms):
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, ms)
+
+
+def warn(message):
+    timer = _current.get()
+    if timer is None:
+        sys.stderr.write(message + "\n")
+    else:
+        with timer._lock:
+            timer.warnings.append(message)
+
+
+def record_strava(nbytes, ms):
+    timer = _current.get()
+    if timer is not None:
+        timer.strava_call(nbytes, ms)
+
+
+@contextmanager
+def timer_scope(method, path):
+    """The current request timer, or a new one for work outside a request (CLI, batch jobs)."""
+    timer = _current.get()
+    if timer is not None:
+        yield timer
+        return
+    timer = RequestTimer(method, path)
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+
+
+def submit(pool, fn, *args):
+    """pool.submit that keeps the request timer visible in the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _dump_profile(profiler, timer):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = timer.path.strip("/").replace("/", "_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{name}-{int(time.time() * 1000)}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def instrumented(method):
+    """Wrap a do_* method: time it, add Server-Timing to its headers, log one line."""
+    @functools.wraps(method)
+    def wrapper(self):
+        timer = RequestTimer(self.command, urlparse(self.path).path)
+        token = _current.set(timer)
+        send_response, end_headers = self.send_response, self.end_headers
+
+        def timed_send_response(code, message=None):
+            timer.status = code
+            send_response(code, message)
+
+        def timed_end_headers():
+            self.send_header("Server-Timing", timer.header())
+            self.send_header("Timing-Allow-Origin", "*")
+            end_headers()
+
+        self.send_response, self.end_headers = timed_send_response, timed_end_headers
+        profiler = cProfile.Profile() if PROFILE_SAMPLE and random.random() < PROFILE_SAMPLE else None
+        try:
+            if profiler:
+                profiler.enable()
+            try:
+                return method(self)
+            finally:
+                if profiler:
+                    profiler.disable()
+        finally:
+            _current.reset(token)
+            profile = None
+            if profiler and timer.elapsed() >= PROFILE_SLOW_MS:
+                try:
+                    profile = _dump_profile(profiler, timer)
+                except OSError:
+                    pass
+            if REQUEST_LOG:
+                sys.stderr.write(json.dumps(timer.record(profile)) + "\n")
+    return wrapper
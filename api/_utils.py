@@ -1,45 +1,124 @@
 """Shared utilities for serverless functions."""
-import json
+import os
+import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import httpx
-
-STRAVA_API = "https://www.strava.com/api/v3"
-
-
-def json_resp(data, status=200):
-    body = json.dumps(data, default=str)
-    return body, status, {
-        "Content-Type": "application/json",
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization",
-    }
-
-
-def strava_get(token, endpoint, params=None):
-    """Direct Strava API call."""
-    with httpx.Client(timeout=30.0) as client:
-        r = client.get(
+from api._ratelimit import scheduler, INTERACTIVE, MAX_RETRIES, RateLimitExceeded
+from api._timing import record_strava, submit
+
+# overridable so tools/fake_strava.py can stand in for Strava in load tests
+STRAVA_BASE = os.environ.get("STRAVA_BASE_URL", "https://www.strava.com").rstrip("/")
+STRAVA_API = f"{STRAVA_BASE}/api/v3"
+STRAVA_TOKEN_URL = f"{STRAVA_BASE}/oauth/token"
+PAGE_WINDOW = int(os.environ.get("STRAVA_PAGE_WINDOW", "4"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def http_client():
+    """Process-wide keep-alive client (HTTP/2 when the h2 package is installed)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            _client = httpx.Client(
+                timeout=30.0,
+                http2=http2,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            )
+        return _client
+
+
+def token_key(token):
+    """Short stable key identifying a token in rate-limit accounting."""
+    return hashlib.sha1(token.encode()).hexdigest()[:16]
+
+
+def strava_get(token, endpoint, params=None, priority=INTERACTIVE, timeout=None):
+    """Strava API call scheduled against the shared rate budget (429s are retried).
+
+    `timeout` bounds the wait for a rate slot (RateLimitExceeded past it).
+    """
+    key = token_key(token)
+    for attempt in range(MAX_RETRIES + 1):
+        scheduler.acquire(key, priority, timeout)
+        t0 = time.perf_counter()
+        r = http_client().get(
             f"{STRAVA_API}{endpoint}",
             headers={"Authorization": f"Bearer {token}"},
             params=params or {}
         )
+        record_strava(len(r.content), (time.perf_counter() - t0) * 1000)
+        scheduler.update(r.headers)
+        if r.status_code == 429 and attempt < MAX_RETRIES:
+            scheduler.backoff(r.headers, attempt)
+            continue
         r.raise_for_status()
         return r.json()
 
 
+def iter_pages(token, endpoint, params=None, per_page=200, window=PAGE_WINDOW, priority=INTERACTIVE, start=1):
+    """Yield pages in order; after each full page up to `window` following pages are in flight.
+
+    The first page is fetched alone, so a listing that fits on one page costs
+    one call. Pages past the next one are speculative: they only take a rate
+    slot that is free right away and are refetched normally when awaited if
+    they got none, so they never hold up the page being waited on. Iteration
+    stops at the first short page and any outstanding requests are cancelled.
+    """
+    base = dict(params or {}, per_page=per_page)
+    pool = ThreadPoolExecutor(max_workers=max(1, window))
+
+    def fetch(p, timeout=None):
+        return submit(pool, strava_get, token, endpoint, dict(base, page=p), priority, timeout)
+
+    try:
+        pending = {start: (fetch(start), False)}
+        page = start
+        while True:
+            future, speculative = pending.pop(page)
+            try:
+                batch = future.result()
+            except RateLimitExceeded:
+                if not speculative:
+                    raise
+                batch = strava_get(token, endpoint, dict(base, page=page), priority)
+            if batch:
+                yield batch
+            if len(batch) < per_page:
+                break
+            for p in range(page + 1, page + window + 1):
+                if p not in pending:
+                    pending[p] = (fetch(p, None if p == page + 1 else 0), p != page + 1)
+            page += 1
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_pages(token, endpoint, params=None, per_page=200, window=PAGE_WINDOW, priority=INTERACTIVE):
+    """Fetch every page of a paginated endpoint concurrently, concatenated in order."""
+    items = []
+    for batch in iter_pages(token, endpoint, params, per_page, window, priority):
+        items.extend(batch)
+    return items
+
+
+def fetch_activities(token, after=None, per_page=200, priority=INTERACTIVE):
+    """Fetch activity summaries of every type (paginated), optionally only after an epoch."""
+    params = {"after": int(after)} if after else {}
+    return fetch_pages(token, "/athlete/activities", params, per_page, priority=priority)
+
+
 def get_all_activities(token, per_page=200):
     """Fetch all running activities (paginated)."""
-    all_acts = []
-    page = 1
-    while True:
-        acts = strava_get(token, "/athlete/activities", {"page": page, "per_page": per_page})
-        if not acts:
-            break
-        all_acts.extend([a for a in acts if a.get("type") == "Run"])
-        if len(acts) < per_page:
-            break
-        page += 1
-    return all_acts
+    return [a for a in fetch_activities(token, per_page=per_page) if a.get("type") == "Run"]
 
 
 def fmt_time(seconds):
@@ -71,43 +150,106 @@ def extract_token(headers):
     return None
 
 
+DISTANCE_THRESHOLDS = {
+    "5k": (4500, 5500),
+    "10k": (9500, 10500),
+    "semi": (20500, 22000),
+    "marathon": (41500, 43500),
+}
+
+
 def match_distance(distance_m, dist_type):
     """Check if an activity distance matches a standard race distance."""
-    thresholds = {
-        "5k": (4500, 5500),
-        "10k": (9500, 10500),
-        "semi": (20500, 22000),
-        "marathon": (41500, 43500),
-    }
-    lo, hi = thresholds.get(dist_type, (0, 0))
+    lo, hi = DISTANCE_THRESHOLDS.get(dist_type, (0, 0))
     return lo <= distance_m <= hi
 
 
-def compute_prs(activities):
-    """Compute personal records from activity list."""
+# Strava best_efforts names of the PR distances
+BEST_EFFORT_NAMES = {"5k": "5k", "10k": "10k", "semi": "Half-Marathon", "marathon": "Marathon"}
+
+
+def summary_record(a):
+    """Whole-run record (moving time) for a run whose distance matches a PR distance."""
+    return {
+        "date": a["start_date_local"],
+        "time": a.get("moving_time"),
+        "activity_id": a["id"],
+        "distance": a.get("distance"),
+    }
+
+
+def effort_records(a, efforts):
+    """(dist_type, record) pairs from a run's Strava best efforts (elapsed time)."""
+    by_name = {e.get("name"): e for e in efforts}
+    out = []
+    for dist_type, name in BEST_EFFORT_NAMES.items():
+        e = by_name.get(name)
+        if e and e.get("elapsed_time"):
+            out.append((dist_type, {
+                "date": a["start_date_local"],
+                "time": e["elapsed_time"],
+                "activity_id": a["id"],
+                "distance": e.get("distance"),
+                "source": "best_effort",
+            }))
+    return out
+
+
+def compute_prs(frame, efforts=None):
+    """Compute personal records from an ActivityFrame.
+
+    `efforts` maps activity ids to their best efforts; those runs contribute
+    every PR distance they cover (a 5k inside a half marathon) instead of a
+    whole-run distance match.
+    """
+    efforts = efforts or {}
     prs = {}
-    for dist_type in ["5k", "10k", "semi", "marathon"]:
-        matching = []
-        for a in activities:
-            if match_distance(a.get("distance", 0), dist_type):
-                matching.append({
-                    "date": a["start_date_local"],
-                    "time": a["moving_time"],
-                    "activity_id": a["id"],
-                    "distance": a["distance"],
-                })
-        matching.sort(key=lambda x: x["time"])
-        if matching:
-            best_time = matching[0]["time"]
-            for m in matching:
-                m["formatted"] = fmt_time(m["time"])
-                m["pace"] = compute_pace(m["time"], dist_type)
-                m["is_best"] = m["time"] == best_time
-                m["pct_off_best"] = round(((m["time"] - best_time) / best_time) * 100, 1) if best_time > 0 else 0
-        prs[dist_type] = matching
+    for dist_type, (lo, hi) in DISTANCE_THRESHOLDS.items():
+        prs[dist_type] = [summary_record(a) for a in frame.filter("distance", lo, hi).rows
+                          if a["id"] not in efforts]
+    if efforts:
+        for a in frame.rows:
+            if a["id"] in efforts:
+                for dist_type, r in effort_records(a, efforts[a["id"]]):
+                    prs[dist_type].append(r)
+    for dist_type, matching in prs.items():
+        matching.sort(key=lambda x: (x["time"], x["date"]))
+        rank_records(dist_type, matching)
     return prs
 
 
+def rank_records(dist_type, matching):
+    """Annotate records already sorted by time with pace and gap to the best."""
+    if matching:
+        best_time = matching[0]["time"]
+        for m in matching:
+            m["formatted"] = fmt_time(m["time"])
+            m["pace"] = compute_pace(m["time"], dist_type)
+            m["is_best"] = m["time"] == best_time
+            m["pct_off_best"] = round(((m["time"] - best_time) / best_time) * 100, 1) if best_time > 0 else 0
+    return matching
+
+
 def riegel_projection(t1, d1, d2):
     """Riegel formula: T2 = T1 * (D2/D1)^1.06"""
     return t1 * ((d2 / d1) ** 1.06)
+
+
+def riegel_projections(prs):
+    """Riegel projections from the best 10k and semi times."""
+    projections = {}
+    for src, src_dist, targets in [
+        ("10k", 10000, [("semi", 21097.5), ("marathon", 42195)]),
+        ("semi", 21097.5, [("marathon", 42195)]),
+    ]:
+        if prs.get(src):
+            best = prs[src][0]["time"]
+            for tgt_name, tgt_dist in targets:
+                proj = riegel_projection(best, src_dist, tgt_dist)
+                projections[f"{tgt_name}_from_{src}"] = {
+                    "seconds": round(proj),
+                    "formatted": fmt_time(round(proj)),
+                    "source_time": fmt_time(best),
+                    "source_distance": src,
+                }
+    return projections
@@ -0,0 +1,87 @@
+"""Dense daily series with prefix sums for O(1) window queries.
+
+prefix[i] holds the total of the first i days, so any inclusive day range is
+prefix[j + 1] - prefix[i] and a whole rolling series is one vector
+subtraction per window length.
+"""
+from array import array
+from itertools import accumulate
+
+from api._frame import np
+
+
+class DailySeries:
+    def __init__(self, days, values, start=None, end=None):
+        if start is None:
+            start = int(min(days)) if len(days) else (end or 0)
+        if end is None:
+            end = int(max(days)) if len(days) else start
+        self.start = start
+        self.end = max(end, start)
+        n = self.end - self.start + 1
+        if np is not None:
+            idx = np.asarray(days, dtype=np.int64) - start
+            keep = (idx >= 0) & (idx < n)
+            dense = np.bincount(idx[keep], weights=np.asarray(values, dtype=np.float64)[keep], minlength=n)
+            self.prefix = np.concatenate(([0.0], np.cumsum(dense)))
+        else:
+            dense = array("d", bytes(8 * n))
+            for d, v in zip(days, values):
+                if start <= d <= self.end:
+                    dense[d - start] += v
+            self.prefix = array("d", accumulate(dense, initial=0.0))
+
+    @classmethod
+    def from_frame(cls, frame, col="distance", start=None, end=None):
+        return cls(frame["day"], frame[col], start, end)
+
+    def _index(self, day):
+        """Number of stored days strictly before `day` (clamped to the series)."""
+        return min(max(day - self.start, 0), self.end - self.start + 1)
+
+    def total(self, lo, hi):
+        """Sum over the inclusive day range [lo, hi]."""
+        if hi < lo:
+            return 0.0
+        return float(self.prefix[self._index(hi + 1)] - self.prefix[self._index(lo)])
+
+    def trailing(self, day, window):
+        """Sum of the `window` days ending at `day` (inclusive)."""
+        return self.total(day - window + 1, day)
+
+    def values(self):
+        """Per-day totals from start to end."""
+        if np is not None:
+            return np.diff(self.prefix)
+        return array("d", [b - a for a, b in zip(self.prefix, self.prefix[1:])])
+
+    def rolling(self, window, lo=None, hi=None):
+        """Trailing `window`-day sums for every day in [lo, hi]."""
+        return self.rolling_many([window], lo, hi)[window]
+
+    def rolling_many(self, windows, lo=None, hi=None):
+        """{window: [trailing sums for each day in lo..hi]} from a single prefix array."""
+        lo = self.start if lo is None else lo
+        hi = self.end if hi is None else hi
+        if np is not None:
+            days = np.arange(lo, hi + 1)
+            n = self.end - self.start + 1
+            upper = self.prefix[np.clip(days + 1 - self.start, 0, n)]
+            return {
+                w: (upper - self.prefix[np.clip(days + 1 - w - self.start, 0, n)]).tolist()
+                for w in windows
+            }
+        uppers = [self.prefix[self._index(d + 1)] for d in range(lo, hi + 1)]
+        return {
+            w: [u - self.prefix[self._index(d + 1 - w)] for d, u in zip(range(lo, hi + 1), uppers)]
+            for w in windows
+        }
+
+
+def rounded(values, ndigits, scale=1):
+    """round(v / scale, ndigits) over a whole column (one vector op with numpy)."""
+    if np is not None:
+        return np.round(np.asarray(values, dtype=np.float64) / scale, ndigits).tolist()
+    if scale == 1:
+        return [round(v, ndigits) for v in values]
+    return [round(v / scale, ndigits) for v in values]
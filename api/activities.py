@@ -1,79 +1,224 @@
-"""Fetch all running activities with GPS polylines for caching."""
-from http.server import BaseHTTPRequestHandler
-import json
+"""Fetch all running activities with GPS polylines for caching.
+
+?format=ndjson streams one activity per line (chunked): stored activities
+first, then each newly synced Strava page as it arrives. The last line is a
+trailer {"done": true, "count": n, "cursor": epoch, "complete": bool} where
+cursor can be sent back as ?after= to resume; when the sync stopped on its
+time budget, "complete" is false and the next request continues it. The
+token is resolved before the 200 is sent, so an unknown or revoked token is
+a plain 401; a failure during the stream ends it with {"done": false,
+"error", "status"} (status: Strava's HTTP status, 401 if the token expired).
+
+?polyline=lod0|lod1 replaces summary_polyline with a Douglas-Peucker
+simplified version (cached per activity), ?polyline=none drops it.
+
+?fields=start_date_local,distance,moving_time keeps only those fields (plus
+id). ?format=columnar returns one array per field instead of one object per
+activity: start_date_local becomes seconds from "date_base" and the columns
+listed in "delta" hold differences from the previous value.
+
+?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive, either optional) keeps the runs
+started in that range; stored runs are read through the date index.
+"""
+import calendar
+from datetime import datetime
 from urllib.parse import urlparse, parse_qs
-from api._utils import extract_token, strava_get, json_resp
+import httpx
+from api._context import date_range
+from api._frame import parse_day
+from api._polyline import LEVELS
+from api._response import JSONHandler, request_etag, not_modified, dumps
+from api._store import (athlete_for_token, sync, sync_step, needs_sync, load_runs, data_version, epoch,
+                        polyline_levels)
+from api._timing import instrumented, phase
+from api._utils import extract_token
+
+STREAM_BUDGET = 40
+POLYLINE_MODES = ("raw", "none", *LEVELS)
+FIELDS = (
+    "id", "name", "start_date_local", "distance", "moving_time", "elapsed_time", "total_elevation_gain",
+    "average_speed", "max_speed", "average_heartrate", "max_heartrate", "summary_polyline",
+    "start_latlng", "end_latlng", "suffer_score", "pr_count",
+)
+DELTA_FIELDS = ("id", "start_date_local")
+
+
+def _transform(a, polyline="raw", levels=None):
+    out = {
+        "id": a["id"],
+        "name": a.get("name", ""),
+        "start_date_local": a.get("start_date_local", ""),
+        "distance": a.get("distance", 0),
+        "moving_time": a.get("moving_time", 0),
+        "elapsed_time": a.get("elapsed_time", 0),
+        "total_elevation_gain": a.get("total_elevation_gain", 0),
+        "average_speed": a.get("average_speed", 0),
+        "max_speed": a.get("max_speed", 0),
+        "average_heartrate": a.get("average_heartrate"),
+        "max_heartrate": a.get("max_heartrate"),
+        "summary_polyline": (a.get("map") or {}).get("summary_polyline", ""),
+        "start_latlng": a.get("start_latlng"),
+        "end_latlng": a.get("end_latlng"),
+        "suffer_score": a.get("suffer_score"),
+        "pr_count": a.get("pr_count", 0),
+    }
+    if polyline == "none":
+        del out["summary_polyline"]
+    elif polyline in LEVELS:
+        out["summary_polyline"] = levels[a["id"]][polyline]
+    return out
+
+
+def _transform_all(athlete_id, activities, polyline, fields=None):
+    if fields is not None and "summary_polyline" not in fields:
+        polyline = "none"
+    with phase("transform"):
+        levels = polyline_levels(athlete_id, activities) if polyline in LEVELS else None
+        rows = [_transform(a, polyline, levels) for a in activities]
+        if fields is not None:
+            rows = [{f: r[f] for f in fields if f in r} for r in rows]
+    return rows
+
+
+def _in_range(a, lo=None, hi=None):
+    if lo is None and hi is None:
+        return True
+    day = parse_day(a["start_date_local"])
+    return (lo is None or day >= lo) and (hi is None or day <= hi)
+
+
+def _parse_fields(value):
+    """Requested fields in FIELDS order (id always included), None for all."""
+    if not value:
+        return None
+    wanted = set(value.split(","))
+    unknown = wanted - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return [f for f in FIELDS if f in wanted or f == "id"]
+
+
+def _local_seconds(s):
+    """start_date_local ("2024-03-01T07:30:00Z", wall-clock time) as seconds."""
+    return calendar.timegm(datetime.strptime(s[:19], "%Y-%m-%dT%H:%M:%S").timetuple())
+
+
+def _delta(values, base=0):
+    out, prev = [], base
+    for v in values:
+        out.append(v - prev)
+        prev = v
+    return out
+
 
+def _columnar(rows, fields=None):
+    """Column-per-field encoding of transformed activities (oldest first)."""
+    # every row carries the same keys (polyline=none drops summary_polyline)
+    fields = fields or (list(rows[0]) if rows else list(FIELDS))
+    columns = {f: [r.get(f) for r in rows] for f in fields}
+    date_base = 0
+    if "start_date_local" in columns:
+        seconds = [_local_seconds(s) for s in columns["start_date_local"]]
+        date_base = seconds[0] if seconds else 0
+        columns["start_date_local"] = seconds
+    delta = [f for f in DELTA_FIELDS if f in columns]
+    for f in delta:
+        columns[f] = _delta(columns[f], date_base if f == "start_date_local" else 0)
+    return {
+        "format": "columnar",
+        "count": len(rows),
+        "fields": fields,
+        "date_base": date_base,
+        "delta": delta,
+        "columns": columns,
+    }
 
-class handler(BaseHTTPRequestHandler):
+
+class handler(JSONHandler):
+    @instrumented
     def do_GET(self):
         token = extract_token(self.headers)
         if not token:
-            body, status, hdrs = json_resp({"error": "No token"}, 401)
-            self.send_response(status)
-            for k, v in hdrs.items():
-                self.send_header(k, v)
-            self.end_headers()
-            self.wfile.write(body.encode())
+            self._json({"error": "No token"}, 401)
             return
 
         params = parse_qs(urlparse(self.path).query)
         after = params.get("after", [None])[0]
+        polyline = params.get("polyline", ["raw"])[0]
+        fmt = params.get("format", ["json"])[0]
+        if polyline not in POLYLINE_MODES:
+            self._json({"error": f"polyline must be one of {', '.join(POLYLINE_MODES)}"}, 400)
+            return
+        try:
+            fields = _parse_fields(params.get("fields", [None])[0])
+            lo, hi = date_range(params) or (None, None)
+            after = int(after) if after else 0
+        except ValueError as e:
+            self._json({"error": str(e)}, 400)
+            return
+
+        if fmt == "ndjson":
+            self._stream(token, after, polyline, fields, lo, hi)
+            return
+
+        try:
+            athlete_id = sync(token)
+            etag = request_etag(self, athlete_id, data_version(athlete_id))
+            if not_modified(self, etag):
+                return
+            all_acts = _transform_all(athlete_id, [
+                a for a in load_runs(athlete_id, lo, hi)
+                if epoch(a.get("start_date")) > after
+            ], polyline, fields)
+            if fmt == "columnar":
+                self._json(_columnar(all_acts, fields), etag=etag)
+            else:
+                self._json({"activities": all_acts, "count": len(all_acts)}, etag=etag)
+        except Exception as e:
+            self._json({"error": str(e)}, 500)
 
+    def _stream(self, token, after, polyline="raw", fields=None, lo=None, hi=None):
         try:
-            all_acts = []
-            page = 1
-            req_params = {"per_page": 200}
-            if after:
-                req_params["after"] = int(after)
-
-            while True:
-                req_params["page"] = page
-                acts = strava_get(token, "/athlete/activities", req_params)
-                if not acts:
-                    break
-                for a in acts:
-                    if a.get("type") != "Run":
-                        continue
-                    all_acts.append({
-                        "id": a["id"],
-                        "name": a.get("name", ""),
-                        "start_date_local": a.get("start_date_local", ""),
-                        "distance": a.get("distance", 0),
-                        "moving_time": a.get("moving_time", 0),
-                        "elapsed_time": a.get("elapsed_time", 0),
-                        "total_elevation_gain": a.get("total_elevation_gain", 0),
-                        "average_speed": a.get("average_speed", 0),
-                        "max_speed": a.get("max_speed", 0),
-                        "average_heartrate": a.get("average_heartrate"),
-                        "max_heartrate": a.get("max_heartrate"),
-                        "summary_polyline": (a.get("map") or {}).get("summary_polyline", ""),
-                        "start_latlng": a.get("start_latlng"),
-                        "end_latlng": a.get("end_latlng"),
-                        "suffer_score": a.get("suffer_score"),
-                        "pr_count": a.get("pr_count", 0),
-                    })
-                if len(acts) < 200:
-                    break
-                page += 1
-
-            body, status, hdrs = json_resp({"activities": all_acts, "count": len(all_acts)})
-            self.send_response(status)
-            for k, v in hdrs.items():
-                self.send_header(k, v)
-            self.end_headers()
-            self.wfile.write(body.encode())
+            athlete_id = athlete_for_token(token)
+        except httpx.HTTPStatusError as e:
+            self._json({"error": str(e)}, 401 if e.response.status_code == 401 else 502)
+            return
         except Exception as e:
-            body, status, hdrs = json_resp({"error": str(e)}, 500)
-            self.send_response(status)
-            for k, v in hdrs.items():
-                self.send_header(k, v)
-            self.end_headers()
-            self.wfile.write(body.encode())
-
-    def do_OPTIONS(self):
+            self._json({"error": str(e)}, 500)
+            return
+
+        self.protocol_version = "HTTP/1.1"
         self.send_response(200)
         self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
         self.end_headers()
+
+        state = {"count": 0, "cursor": after}
+
+        def write(batch):
+            runs = [a for a in batch if a.get("type", "Run") == "Run" and _in_range(a, lo, hi)]
+            lines = []
+            for a, out in zip(runs, _transform_all(athlete_id, runs, polyline, fields)):
+                lines.append(dumps(out))
+                state["count"] += 1
+                state["cursor"] = max(state["cursor"], epoch(a.get("start_date")))
+            if lines:
+                self._chunk(b"\n".join(lines) + b"\n")
+
+        try:
+            write([a for a in load_runs(athlete_id, lo, hi) if epoch(a.get("start_date")) > after])
+            complete = True
+            if needs_sync(athlete_id):
+                complete = sync_step(token, athlete_id, time_budget=STREAM_BUDGET, on_page=write)["complete"]
+            self._chunk(dumps({"done": True, "complete": complete, **state}) + b"\n")
+        except Exception as e:
+            status = {"status": e.response.status_code} if isinstance(e, httpx.HTTPStatusError) else {}
+            self._chunk(dumps({"done": False, "error": str(e), **status, **state}) + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
@@ -1,11 +1,106 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import os
 from urllib.parse import urlparse, parse_qs
-from datetime import datetime, timedelta
-from api._utils import extract_token, get_all_activities, fmt_time, match_distance
+from api._context import Context, date_range
+from api._response import JSONHandler, request_etag, not_modified
+from api._store import sync, data_version
+from api._streams import analyze, fetch_streams
+from api._timing import instrumented, phase
+from api._utils import extract_token, fmt_time, DISTANCE_THRESHOLDS
 
 
-class handler(BaseHTTPRequestHandler):
+def _pace(ctx, params):
+    runs = ctx.frame.filter("distance", 3000, strict=True)
+    result = []
+    for a in reversed(runs.rows[-100:]):
+        pace = a["moving_time"] / (a["distance"] / 1000)
+        result.append({
+            "date": a["start_date_local"],
+            "name": a.get("name", ""),
+            "distance_km": round(a["distance"] / 1000, 2),
+            "pace_s_km": round(pace, 1),
+            "pace_formatted": f"{int(pace // 60)}:{int(pace % 60):02d}",
+            "heartrate": a.get("average_heartrate"),
+        })
+    return result
+
+
+def _cardiac(ctx, params):
+    runs = ctx.frame.filter("distance", 5000, strict=True).filter("hr", 0, strict=True)
+    result = []
+    for a in reversed(runs.rows[-200:]):
+        pace = a["moving_time"] / (a["distance"] / 1000)
+        eff = a.get("average_speed", 0) * 3.6 / a["average_heartrate"]
+        result.append({
+            "date": a["start_date_local"],
+            "name": a.get("name", ""),
+            "pace_s_km": round(pace, 1),
+            "avg_hr": a["average_heartrate"],
+            "max_hr": a.get("max_heartrate"),
+            "efficiency": round(eff, 4) if eff else None,
+        })
+    return result
+
+
+def _long_runs(ctx, params):
+    """Most recent runs of at least `min_km` (default 10), at most `limit` (default 100)."""
+    min_km = float(params.get("min_km", ["10"])[0])
+    limit = int(params.get("limit", ["100"])[0])
+    return ctx.frame.filter("distance", min_km * 1000).rows[-limit:]
+
+
+def _streams(ctx, params):
+    """Decoupling, HR drift and pace variability from per-second streams of long runs."""
+    runs = _long_runs(ctx, params)
+    found = analyze(ctx.athlete_id, [a["id"] for a in runs]) if ctx.athlete_id is not None else {}
+    result = []
+    for a in reversed(runs):
+        m = found.get(a["id"])
+        if m is None or "avg_speed" not in m:
+            continue
+        result.append({
+            "date": a["start_date_local"],
+            "name": a.get("name", ""),
+            "activity_id": a["id"],
+            "distance_km": round(a["distance"] / 1000, 2),
+            "moving_s": m["moving_s"],
+            "avg_hr": m.get("avg_hr"),
+            "decoupling_pct": m.get("decoupling_pct"),
+            "hr_drift_pct": m.get("hr_drift_pct"),
+            "pace_cv_pct": m.get("pace_cv_pct"),
+        })
+    return {"runs": result, "pending": sum(1 for a in runs if a["id"] not in found)}
+
+
+def _vol_perf(ctx, params):
+    lo, hi = DISTANCE_THRESHOLDS["10k"]
+    runs_10k = ctx.frame.filter("distance", lo, hi)
+    series = ctx.daily
+    result = []
+    for i, r in enumerate(runs_10k.rows):
+        day = int(runs_10k["day"][i])
+        vol = series.total(day - 29, day) / 1000
+        result.append({
+            "date": r["start_date_local"][:10],
+            "time_10k": r["moving_time"],
+            "formatted": fmt_time(r["moving_time"]),
+            "volume_30d_km": round(vol, 1),
+        })
+    return result
+
+
+MODES = {
+    "pace": _pace,
+    "cardiac": _cardiac,
+    "volume_perf": _vol_perf,
+    "streams": _streams,
+}
+
+# seconds a mode=streams request may spend fetching streams it has not seen
+STREAM_FETCH_BUDGET = float(os.environ.get("STREAM_FETCH_BUDGET", "8"))
+
+
+class handler(JSONHandler):
+    @instrumented
     def do_GET(self):
         token = extract_token(self.headers)
         if not token:
@@ -14,90 +109,23 @@ class handler(BaseHTTPRequestHandler):
 
         params = parse_qs(urlparse(self.path).query)
         mode = params.get("mode", ["pace"])[0]
+        try:
+            span = date_range(params)
+        except ValueError as e:
+            self._json({"error": str(e)}, 400)
+            return
 
         try:
-            activities = get_all_activities(token)
-
-            if mode == "pace":
-                self._json(self._pace(activities))
-            elif mode == "cardiac":
-                self._json(self._cardiac(activities))
-            elif mode == "volume_perf":
-                self._json(self._vol_perf(activities))
-            else:
-                self._json([])
+            athlete_id = sync(token)
+            if mode == "streams" and params.get("fetch", ["1"])[0] != "0":
+                ids = [a["id"] for a in _long_runs(Context(athlete_id=athlete_id, span=span), params)]
+                fetch_streams(token, athlete_id, ids, STREAM_FETCH_BUDGET)
+            etag = request_etag(self, athlete_id, data_version(athlete_id))
+            if not_modified(self, etag):
+                return
+            ctx = Context(athlete_id=athlete_id, span=span)
+            with phase("compute"):
+                data = MODES[mode](ctx, params) if mode in MODES else []
+            self._json(data, etag=etag)
         except Exception as e:
             self._json({"error": str(e)}, 500)
-
-    def _pace(self, activities):
-        result = []
-        runs = [a for a in activities if a.get("distance", 0) > 3000]
-        runs.sort(key=lambda x: x["start_date_local"], reverse=True)
-        for a in runs[:100]:
-            pace = a["moving_time"] / (a["distance"] / 1000) if a["distance"] > 0 else 0
-            result.append({
-                "date": a["start_date_local"],
-                "name": a.get("name", ""),
-                "distance_km": round(a["distance"] / 1000, 2),
-                "pace_s_km": round(pace, 1),
-                "pace_formatted": f"{int(pace // 60)}:{int(pace % 60):02d}",
-                "heartrate": a.get("average_heartrate"),
-            })
-        return result
-
-    def _cardiac(self, activities):
-        result = []
-        runs = [a for a in activities if a.get("average_heartrate") and a.get("distance", 0) > 5000]
-        runs.sort(key=lambda x: x["start_date_local"], reverse=True)
-        for a in runs[:200]:
-            pace = a["moving_time"] / (a["distance"] / 1000) if a["distance"] > 0 else 0
-            speed_kmh = a.get("average_speed", 0) * 3.6
-            eff = speed_kmh / a["average_heartrate"] if a["average_heartrate"] else None
-            result.append({
-                "date": a["start_date_local"],
-                "name": a.get("name", ""),
-                "pace_s_km": round(pace, 1),
-                "avg_hr": a["average_heartrate"],
-                "max_hr": a.get("max_heartrate"),
-                "efficiency": round(eff, 4) if eff else None,
-            })
-        return result
-
-    def _vol_perf(self, activities):
-        runs_10k = sorted(
-            [a for a in activities if match_distance(a.get("distance", 0), "10k")],
-            key=lambda x: x["start_date_local"]
-        )
-        result = []
-        for r in runs_10k:
-            d = r["start_date_local"][:10]
-            dt = datetime.fromisoformat(d)
-            d30 = dt - timedelta(days=30)
-            vol = sum(
-                a["distance"] for a in activities
-                if d30.isoformat() <= a["start_date_local"][:10] <= d
-            ) / 1000
-            result.append({
-                "date": d,
-                "time_10k": r["moving_time"],
-                "formatted": fmt_time(r["moving_time"]),
-                "volume_30d_km": round(vol, 1),
-            })
-        return result
-
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self._cors()
-        self.end_headers()
-
-    def _json(self, data, status=200):
-        self.send_response(status)
-        self._cors()
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
-
-    def _cors(self):
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
@@ -4,12 +4,16 @@ from urllib.parse import urlparse, parse_qs, urlencode
 import os
 import json
 import httpx
+from api._store import save_tokens
+from api._timing import instrumented
+from api._utils import STRAVA_TOKEN_URL
 
 CLIENT_ID = os.environ.get("STRAVA_CLIENT_ID", "97899")
 CLIENT_SECRET = os.environ.get("STRAVA_CLIENT_SECRET", "")
 
 
 class handler(BaseHTTPRequestHandler):
+    @instrumented
     def do_GET(self):
         params = parse_qs(urlparse(self.path).query)
         code = params.get("code", [None])[0]
@@ -23,7 +27,7 @@ class handler(BaseHTTPRequestHandler):
 
         try:
             with httpx.Client() as client:
-                resp = client.post("https://www.strava.com/oauth/token", data={
+                resp = client.post(STRAVA_TOKEN_URL, data={
                     "client_id": CLIENT_ID,
                     "client_secret": CLIENT_SECRET,
                     "code": code,
@@ -33,6 +37,8 @@ class handler(BaseHTTPRequestHandler):
                 data = resp.json()
 
             athlete = data.get("athlete", {})
+            if athlete.get("id"):
+                save_tokens(athlete["id"], data["access_token"], data["refresh_token"], data["expires_at"])
             fragment = urlencode({
                 "access_token": data["access_token"],
                 "refresh_token": data["refresh_token"],
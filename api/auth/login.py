@@ -1,10 +1,12 @@
 from http.server import BaseHTTPRequestHandler
 import os
+from api._timing import instrumented
 
 CLIENT_ID = os.environ.get("STRAVA_CLIENT_ID", "97899")
 
 
 class handler(BaseHTTPRequestHandler):
+    @instrumented
     def do_GET(self):
         redirect_uri = os.environ.get("STRAVA_REDIRECT_URI", "")
         if not redirect_uri:
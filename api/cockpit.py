@@ -1,86 +1,115 @@
-from http.server import BaseHTTPRequestHandler
-import json
-from datetime import datetime, timedelta
-from api._utils import extract_token, get_all_activities, compute_prs, riegel_projection, fmt_time
+from urllib.parse import urlparse, parse_qs
+from api._context import Context, date_range
+from api._frame import from_day, parse_day
+from api._load import LoadState
+from api._model import best_fit, parse_targets, project
+from api._response import JSONHandler, request_etag, not_modified
+from api._store import sync, data_version, get_result
+from api._timing import instrumented, phase
+from api._utils import extract_token, riegel_projections
 
 
-class handler(BaseHTTPRequestHandler):
+ACWR_WARNING, ACWR_DANGER = 1.3, 1.5  # acute:chronic load ratio
+TSB_FATIGUE = -30
+CTL_DROP = 0.85  # chronic load vs 4 weeks ago
+
+
+def _today_load(ctx):
+    """(day, atl, ctl) today, or at the last run if it is dated later."""
+    day = max(ctx.today_day, ctx.training.day or ctx.today_day)
+    return (day, *ctx.training.at(day))
+
+
+def _load(ctx, params):
+    """Acute (ATL) and chronic (CTL) load, form (TSB) and their ratio today."""
+    day, atl, ctl = _today_load(ctx)
+    return {
+        "date": from_day(day).isoformat(),
+        "atl": round(atl, 1),
+        "ctl": round(ctl, 1),
+        "tsb": round(ctl - atl, 1),
+        "acwr": round(atl / ctl, 2) if ctl >= 1 else None,
+    }
+
+
+def _load_alerts(ctx):
+    alerts = []
+    day, atl, ctl = _today_load(ctx)
+    if ctl >= 1 and atl / ctl > ACWR_WARNING:
+        alerts.append({"type": "danger" if atl / ctl > ACWR_DANGER else "warning",
+                       "message": f"Charge aigue {atl / ctl:.2f}x la charge chronique"})
+    if ctl - atl < TSB_FATIGUE:
+        alerts.append({"type": "warning", "message": f"Forme (TSB) a {ctl - atl:.0f}: fatigue accumulee"})
+    # chronic load 4 weeks ago: today's state rewound through the last 28 daily loads
+    daily = ctx.training_daily
+    _, ctl_28 = LoadState(day, atl, ctl).rewind([daily.total(d, d) for d in range(day - 27, day + 1)])
+    if ctl_28 >= 1 and ctl < ctl_28 * CTL_DROP:
+        alerts.append({"type": "danger",
+                       "message": f"Charge chronique en baisse de {(1 - ctl / ctl_28) * 100:.0f}% sur 4 semaines"})
+    return alerts
+
+
+def _summary(ctx, params):
+    series = ctx.daily
+    t = ctx.today_day
+    d90 = t - 90
+
+    week_vol = series.total(t - ctx.today.weekday(), t)
+    vol_90 = series.total(d90, t)
+    vol_28 = series.total(t - 28, t)
+    avg_4w = vol_28 / 4 if vol_28 else 0
+
+    alerts = _load_alerts(ctx)
+
+    prs = ctx.prs
+    pr_90d = sum(1 for dist in prs.values() for p in dist if p.get("is_best") and parse_day(p["date"]) >= d90)
+
+    return {
+        "week_volume": round(week_vol / 1000, 2),
+        "volume_90d": round(vol_90 / 1000, 2),
+        "avg_4_weeks": round(avg_4w / 1000, 2),
+        "local_legends": 0,
+        "pr_90d": pr_90d,
+        "projections": riegel_projections(prs),
+        "model_projections": project(best_fit(prs), parse_targets("semi,marathon")),
+        "load": _load(ctx, params),
+        "alerts": alerts,
+        "total_activities": len(ctx.frame),
+    }
+
+
+MODES = {
+    "summary": _summary,
+    "load": _load,
+}
+
+
+class handler(JSONHandler):
+    @instrumented
     def do_GET(self):
         token = extract_token(self.headers)
         if not token:
             self._json({"error": "No token"}, 401)
             return
 
+        params = parse_qs(urlparse(self.path).query)
+        mode = params.get("mode", ["summary"])[0]
         try:
-            activities = get_all_activities(token)
-            now = datetime.now()
-            week_start = now - timedelta(days=now.weekday())
-            d90 = now - timedelta(days=90)
-            d28 = now - timedelta(days=28)
-            d180 = now - timedelta(days=180)
-
-            def parse_date(d):
-                return datetime.fromisoformat(d.replace("Z", "+00:00").replace("+00:00", ""))
-
-            week_vol = sum(a["distance"] for a in activities if parse_date(a["start_date_local"]) >= week_start)
-            vol_90 = sum(a["distance"] for a in activities if parse_date(a["start_date_local"]) >= d90)
-            vol_28 = sum(a["distance"] for a in activities if parse_date(a["start_date_local"]) >= d28)
-            avg_4w = vol_28 / 4 if vol_28 else 0
-            prev_90 = sum(a["distance"] for a in activities if d180 <= parse_date(a["start_date_local"]) < d90)
-
-            alerts = []
-            if avg_4w > 0 and week_vol > avg_4w * 1.2:
-                alerts.append({"type": "warning", "message": f"Volume semaine +{((week_vol/avg_4w)-1)*100:.0f}% vs moyenne 4 sem."})
-            if prev_90 > 0 and vol_90 < prev_90 * 0.85:
-                alerts.append({"type": "danger", "message": f"Volume 90j en baisse de {((1 - vol_90/prev_90))*100:.0f}%"})
-
-            prs = compute_prs(activities)
-            pr_90d = sum(1 for dist in prs.values() for p in dist if p.get("is_best") and parse_date(p["date"]) >= d90)
-
-            # Projections Riegel
-            projections = {}
-            for src, src_dist, targets in [
-                ("10k", 10000, [("semi", 21097.5), ("marathon", 42195)]),
-                ("semi", 21097.5, [("marathon", 42195)]),
-            ]:
-                if prs.get(src):
-                    best = prs[src][0]["time"]
-                    for tgt_name, tgt_dist in targets:
-                        proj = riegel_projection(best, src_dist, tgt_dist)
-                        projections[f"{tgt_name}_from_{src}"] = {
-                            "seconds": round(proj),
-                            "formatted": fmt_time(round(proj)),
-                            "source_time": fmt_time(best),
-                            "source_distance": src,
-                        }
-
-            self._json({
-                "week_volume": round(week_vol / 1000, 2),
-                "volume_90d": round(vol_90 / 1000, 2),
-                "avg_4_weeks": round(avg_4w / 1000, 2),
-                "local_legends": 0,
-                "pr_90d": pr_90d,
-                "projections": projections,
-                "alerts": alerts,
-                "total_activities": len(activities),
-            })
+            span = date_range(params)
+        except ValueError as e:
+            self._json({"error": str(e)}, 400)
+            return
 
+        try:
+            athlete_id = sync(token)
+            etag = request_etag(self, athlete_id, data_version(athlete_id))
+            if not_modified(self, etag):
+                return
+            data = get_result(athlete_id, f"cockpit:{mode}") if set(params) <= {"mode"} else None
+            if data is None:
+                ctx = Context(athlete_id=athlete_id, span=span)
+                with phase("compute"):
+                    data = MODES[mode](ctx, params) if mode in MODES else {}
+            self._json(data, etag=etag)
         except Exception as e:
             self._json({"error": str(e)}, 500)
-
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self._cors()
-        self.end_headers()
-
-    def _json(self, data, status=200):
-        self.send_response(status)
-        self._cors()
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
-
-    def _cors(self):
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
@@ -0,0 +1,48 @@
+"""Scheduled sync: refresh tokens, pull new activities and their details, precompute results.
+
+Invoked daily by Vercel Cron (see vercel.json). The request must carry
+"Authorization: Bearer <CRON_SECRET>"; without CRON_SECRET the endpoint
+refuses every request and only the CLI below runs a pass. Athletes are synced
+least recently synced first, SYNC_WORKERS at a time (api/_batch.py), until
+CRON_BUDGET seconds or the background rate budget run out; an unfinished
+sync keeps its cursor and resumes next run.
+Precomputed results are read back by cockpit/volume/performance/dashboard
+when a request uses default parameters.
+
+    python -m api.cron.sync
+"""
+import os
+import json
+import time
+from api._batch import run_batch, SYNC_WORKERS
+from api._queue import process_queue
+from api._response import JSONHandler
+from api._timing import instrumented
+
+CRON_SECRET = os.environ.get("CRON_SECRET")
+CRON_BUDGET = float(os.environ.get("CRON_BUDGET", "50"))
+
+
+def run(time_budget=CRON_BUDGET, workers=SYNC_WORKERS):
+    """One cron pass; returns a report with per-athlete counts and durations."""
+    t0 = time.time()
+    queue = process_queue(min(10.0, time_budget / 5))
+    return {"queue": queue, **run_batch(workers=workers, time_budget=time_budget - (time.time() - t0))}
+
+
+class handler(JSONHandler):
+    methods = "GET"
+
+    @instrumented
+    def do_GET(self):
+        if not CRON_SECRET or self.headers.get("Authorization") != f"Bearer {CRON_SECRET}":
+            self._json({"error": "Unauthorized"}, 401)
+            return
+        try:
+            self._json(run())
+        except Exception as e:
+            self._json({"error": str(e)}, 500)
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,103 @@
+"""Batched dashboard: every requested section computed from one activity load.
+
+GET /api/dashboard?sections=cockpit,volume:weekly,volume:rolling,performance:records&days=90
+
+Sections are "module" or "module:mode"; the remaining query parameters are
+passed to every section. Shared intermediates (store read, frame, PRs, daily
+series) are built once and their cost is reported under timing["shared"];
+timing["sync"] covers the sync and cache checks before them. Without extra
+parameters, sections precomputed by the cron job are served as stored.
+"""
+import time
+from urllib.parse import urlparse, parse_qs
+from api import analysis, cockpit, performance, volume
+from api._context import Context, date_range
+from api._response import JSONHandler, request_etag, not_modified
+from api._store import sync, data_version, get_result
+from api._timing import instrumented, phase
+from api._utils import extract_token
+
+SECTIONS = {
+    "cockpit": (cockpit.MODES, "summary"),
+    "volume": (volume.MODES, "weekly"),
+    "performance": (performance.MODES, "records"),
+    "analysis": (analysis.MODES, "pace"),
+}
+DEFAULT_SECTIONS = "cockpit,volume:weekly,performance:records,analysis:pace"
+
+
+def _ms(t0):
+    return round((time.perf_counter() - t0) * 1000, 2)
+
+
+def build_dashboard(ctx, sections, params):
+    """Compute each section on the shared context; errors are reported per section."""
+    result, errors, timing = {}, {}, {}
+    for section in sections:
+        module, _, mode = section.partition(":")
+        if module not in SECTIONS:
+            errors[section] = "unknown section"
+            continue
+        modes, default = SECTIONS[module]
+        mode = mode or default
+        if mode not in modes:
+            errors[section] = "unknown mode"
+            continue
+        shared = sum(ctx.timing.values())
+        t0 = time.perf_counter()
+        try:
+            result[section] = modes[mode](ctx, params)
+        except Exception as e:
+            errors[section] = str(e)
+        # shared intermediates built on demand are charged to timing["shared"]
+        timing[section] = round(_ms(t0) - (sum(ctx.timing.values()) - shared), 2)
+    return result, errors, timing
+
+
+def precomputed_sections(athlete_id, sections):
+    """{section: stored result} for sections the cron job has already computed."""
+    ready = {}
+    for section in sections:
+        module, _, mode = section.partition(":")
+        if module in SECTIONS:
+            data = get_result(athlete_id, f"{module}:{mode or SECTIONS[module][1]}")
+            if data is not None:
+                ready[section] = data
+    return ready
+
+
+class handler(JSONHandler):
+    @instrumented
+    def do_GET(self):
+        token = extract_token(self.headers)
+        if not token:
+            self._json({"error": "No token"}, 401)
+            return
+
+        params = parse_qs(urlparse(self.path).query)
+        sections = [s for s in params.get("sections", [DEFAULT_SECTIONS])[0].split(",") if s]
+        try:
+            span = date_range(params)
+        except ValueError as e:
+            self._json({"error": str(e)}, 400)
+            return
+
+        try:
+            t0 = time.perf_counter()
+            athlete_id = sync(token)
+            etag = request_etag(self, athlete_id, data_version(athlete_id))
+            if not_modified(self, etag):
+                return
+            ready = precomputed_sections(athlete_id, sections) if set(params) <= {"sections"} else {}
+            missing = [s for s in sections if s not in ready]
+            ctx = Context(athlete_id=athlete_id, span=span)
+            sync_ms = _ms(t0)
+            with phase("compute"):
+                result, errors, timing = build_dashboard(ctx, missing, params)
+            self._json({
+                "sections": {s: ready[s] if s in ready else result[s] for s in sections if s in ready or s in result},
+                "errors": errors,
+                "timing": {"sync": sync_ms, "shared": ctx.timing, "sections": timing, "precomputed": list(ready)},
+            }, etag=etag)
+        except Exception as e:
+            self._json({"error": str(e)}, 500)
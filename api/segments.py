@@ -1,10 +1,21 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import os
+import time
 from urllib.parse import urlparse, parse_qs
-from api._utils import extract_token, strava_get, fmt_time
+from api._details import fetch_each
+from api._ratelimit import budget, INTERACTIVE, RateLimitExceeded
+from api._response import JSONHandler
+from api._store import athlete_for_token, get_segments, put_segments
+from api._timing import instrumented, phase
+from api._utils import extract_token, fetch_pages, token_key, fmt_time
 
+LEGEND_TTL = int(os.environ.get("SEGMENT_LEGEND_TTL", "86400"))
+# wall-clock seconds a legends request may spend on segment lookups
+LEGEND_BUDGET = float(os.environ.get("SEGMENT_LEGEND_BUDGET", "8"))
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS", "8"))
 
-class handler(BaseHTTPRequestHandler):
+
+class handler(JSONHandler):
+    @instrumented
     def do_GET(self):
         token = extract_token(self.headers)
         if not token:
@@ -26,16 +37,8 @@ class handler(BaseHTTPRequestHandler):
 
     def _starred(self, token):
         """Fetch starred segments with local legend status."""
-        segments = []
-        page = 1
-        while True:
-            batch = strava_get(token, "/segments/starred", {"page": page, "per_page": 100})
-            if not batch:
-                break
-            segments.extend(batch)
-            if len(batch) < 100:
-                break
-            page += 1
+        with phase("fetch"):
+            segments = fetch_pages(token, "/segments/starred", per_page=100)
 
         result = []
         for s in segments:
@@ -52,42 +55,66 @@ class handler(BaseHTTPRequestHandler):
         return result
 
     def _legends(self, token):
-        """Check local legend status on starred segments."""
-        starred = strava_get(token, "/segments/starred", {"per_page": 50})
+        """Check local legend status on all starred segments.
+
+        Details come from the segment cache and are only re-downloaded after
+        LEGEND_TTL. Lookups run concurrently up to what the rate budget allows
+        and stop after LEGEND_BUDGET seconds; segments that could not be
+        checked are returned as "pending". When the starred listing itself is
+        rate limited, the cached segments are used as the list and the result
+        carries "rate_limited": true and "retry_after" (seconds).
+        """
+        deadline = time.time() + LEGEND_BUDGET
+        with phase("auth"):
+            athlete_id = athlete_for_token(token)
+        throttled = None
+        try:
+            with phase("fetch"):
+                starred = fetch_pages(token, "/segments/starred", per_page=100)
+            cached = get_segments(athlete_id, [s["id"] for s in starred])
+        except RateLimitExceeded as e:
+            throttled = {"rate_limited": True, "retry_after": int(e.retry_after)}
+            cached = get_segments(athlete_id)
+            starred = [d for d, _ in cached.values()]
+            deadline = 0
+        now = time.time()
+        stale = sorted(
+            (s for s in starred if s["id"] not in cached or now - cached[s["id"]][1] > LEGEND_TTL),
+            key=lambda s: cached[s["id"]][1] if s["id"] in cached else 0,
+        )
+
+        b = budget(token_key(token))
+        allowance = min(b["tokens"], b["short"]["remaining"], b["daily"]["remaining"], b["athlete"]["remaining"])
+        fetched = []
+
+        def store(batch):
+            put_segments(athlete_id, [d for _, d in batch])
+            fetched.extend(d for _, d in batch)
+
+        fetch_each(token, [s["id"] for s in stale[:allowance]], "/segments/{}", store, deadline,
+                   priority=INTERACTIVE, workers=SEGMENT_WORKERS)
+        done = {d["id"] for d in fetched}
+        pending = [s["id"] for s in stale if s["id"] not in done]
+
+        details = {sid: d for sid, (d, _) in cached.items()}
+        details.update((d["id"], d) for d in fetched)
+
         legends = []
-        for s in starred[:30]:  # Limit to avoid rate limits
-            try:
-                detail = strava_get(token, f"/segments/{s['id']}")
-                ll = detail.get("local_legend") or {}
-                if ll.get("is_local_legend"):
-                    legends.append({
-                        "segment_id": s["id"],
-                        "name": s["name"],
-                        "effort_count": ll.get("effort_count", 0),
-                    })
-            except Exception:
-                continue
+        for s in starred:
+            ll = (details.get(s["id"]) or {}).get("local_legend") or {}
+            if ll.get("is_local_legend"):
+                legends.append({
+                    "segment_id": s["id"],
+                    "name": s["name"],
+                    "effort_count": ll.get("effort_count", 0),
+                })
 
         return {
             "current": legends,
             "total": len(legends),
+            "checked": len(starred) - len(pending),
+            "pending": pending,
             "timeline": {},
             "monthly": [],
+            **(throttled or {}),
         }
-
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self._cors()
-        self.end_headers()
-
-    def _json(self, data, status=200):
-        self.send_response(status)
-        self._cors()
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
-
-    def _cors(self):
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
@@ -0,0 +1,67 @@
+"""Resumable activity sync for large histories.
+
+Each call processes at most `max_pages` pages or `budget` seconds and returns
+{"complete", "cursor", "pages", "count"}. Pass the returned cursor back (or
+nothing: the last cursor is also stored per athlete) until complete is true.
+Once complete, the response reports "details": {"pending"} (runs whose best
+efforts for PRs are missing) and, once it is written, the rest of the budget
+fetches those details within the background allowance.
+"""
+import time
+from urllib.parse import urlparse, parse_qs
+from api._details import fetch_details
+from api._response import JSONHandler
+from api._store import athlete_for_token, sync_step, get_state, decode_cursor, missing_details
+from api._timing import instrumented, phase
+from api._utils import extract_token
+
+DEFAULT_BUDGET = 40
+MAX_BUDGET = 50
+
+
+class handler(JSONHandler):
+    @instrumented
+    def do_GET(self):
+        token = extract_token(self.headers)
+        if not token:
+            self._json({"error": "No token"}, 401)
+            return
+
+        params = parse_qs(urlparse(self.path).query)
+        cursor = params.get("cursor", [None])[0]
+        try:
+            max_pages = params.get("max_pages", [None])[0]
+            max_pages = int(max_pages) if max_pages else None
+            budget = min(float(params.get("budget", [DEFAULT_BUDGET])[0]), MAX_BUDGET)
+            if (max_pages is not None and max_pages < 1) or not budget > 0:
+                raise ValueError("budget and max_pages must be positive")
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError as e:
+            self._json({"error": str(e)}, 400)
+            return
+
+        athlete_id = None
+        deadline = time.time() + budget
+        try:
+            with phase("auth"):
+                athlete_id = athlete_for_token(token)
+            with phase("sync"):
+                result = sync_step(token, athlete_id, cursor=cursor,
+                                   max_pages=max_pages, time_budget=budget)
+            if result["complete"]:
+                result["details"] = {"pending": len(missing_details(athlete_id))}
+            self._json(result)
+        except Exception as e:
+            # pages stored before the failure are kept; resume from the stored cursor
+            stored = get_state(athlete_id)["cursor"] if athlete_id else cursor
+            self._json({"error": str(e), "complete": False, "cursor": stored or cursor}, 502)
+            return
+        self.wfile.flush()
+
+        # after the response: details never hold up the client's sync
+        if result["complete"] and result["details"]["pending"] and deadline - time.time() > 1:
+            try:
+                fetch_details(token, athlete_id, time_budget=deadline - time.time())
+            except Exception:
+                pass
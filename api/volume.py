@@ -1,11 +1,108 @@
-from http.server import BaseHTTPRequestHandler
-import json
 from urllib.parse import urlparse, parse_qs
-from datetime import datetime, timedelta
-from api._utils import extract_token, get_all_activities
-
-
-class handler(BaseHTTPRequestHandler):
+from api._context import Context, date_range
+from api._frame import from_day
+from api._load import series
+from api._response import JSONHandler, request_etag, not_modified
+from api._store import sync, data_version, get_result
+from api._timing import instrumented, phase
+from api._utils import extract_token
+from api._window import rounded
+
+
+def _weekly(ctx, params):
+    years_str = params.get("years", [None])[0]
+    year_filter = years_str.split(",") if years_str else None
+
+    keys, sums, counts = ctx.buckets("week")
+    km, time_s, elev = rounded(sums["distance"], 2, 1000), rounded(sums["moving_time"], 0), rounded(sums["elev"], 1)
+    rows = []
+    for i, k in enumerate(keys):
+        yr = str(k // 100)
+        if year_filter and yr not in year_filter:
+            continue
+        rows.append({
+            "year": yr,
+            "week": f"{k % 100:02d}",
+            "km": km[i],
+            "runs": counts[i],
+            "time_s": int(time_s[i]),
+            "elev": elev[i],
+        })
+
+    if not year_filter and "ma_4w" in sums:
+        # maintained incrementally alongside the weekly buckets
+        for d, ma in zip(rows, sums["ma_4w"]):
+            d["ma_4w"] = ma
+        return rows
+    for i, d in enumerate(rows):
+        window = rows[max(0, i - 3):i + 1]
+        d["ma_4w"] = round(sum(w["km"] for w in window) / len(window), 2)
+    return rows
+
+
+def _monthly(ctx, params):
+    keys, sums, counts = ctx.buckets("month")
+    km, time_s = rounded(sums["distance"], 2, 1000), rounded(sums["moving_time"], 0)
+    return [{
+        "year": str(k // 100),
+        "month": f"{k % 100:02d}",
+        "km": km[i],
+        "runs": counts[i],
+        "time_s": int(time_s[i]),
+    } for i, k in enumerate(keys)]
+
+
+def _yearly(ctx, params):
+    keys, sums, counts = ctx.buckets("year")
+    km, time_s, elev = rounded(sums["distance"], 2, 1000), rounded(sums["moving_time"], 0), rounded(sums["elev"], 1)
+    return [{
+        "year": str(k),
+        "km": km[i],
+        "runs": counts[i],
+        "time_s": int(time_s[i]),
+        "elev": elev[i],
+    } for i, k in enumerate(keys)]
+
+
+def _rolling(ctx, params):
+    """Trailing km per day (from `from` when given); `days` may list several windows ("7,28,90")."""
+    windows = [int(w) for w in params.get("days", ["90"])[0].split(",")]
+    today = ctx.today_day
+    start = today - max(windows) * 2 if ctx.lo is None else ctx.lo
+    # each point covers the inclusive range [d - days, d]
+    sums = ctx.daily.rolling_many([w + 1 for w in windows], start, today)
+    dates = [from_day(d).isoformat() for d in range(start, today + 1)]
+    names = ("date", "km") if len(windows) == 1 else ("date", *(f"km_{w}" for w in windows))
+    columns = [rounded(sums[w + 1], 2, 1000) for w in windows]
+    return [dict(zip(names, row)) for row in zip(dates, *columns)]
+
+
+def _load(ctx, params):
+    """Daily training load with ATL (7 d), CTL (42 d) and TSB; `days` limits the output (all = full history or range)."""
+    days = params.get("days", ["365" if ctx.lo is None else "all"])[0]
+    daily = ctx.training_daily
+    loads, atl, ctl = series(daily)
+    # the filters run over the whole history; only the output is trimmed
+    start = daily.start if days == "all" else max(daily.start, ctx.today_day - int(days) + 1)
+    i = start - daily.start
+    tsb = [c - a for a, c in zip(atl[i:], ctl[i:])]
+    dates = [from_day(d).isoformat() for d in range(start, daily.end + 1)]
+    names = ("date", "load", "atl", "ctl", "tsb")
+    columns = [rounded(loads[i:], 1), rounded(atl[i:], 1), rounded(ctl[i:], 1), rounded(tsb, 1)]
+    return [dict(zip(names, row)) for row in zip(dates, *columns)]
+
+
+MODES = {
+    "weekly": _weekly,
+    "monthly": _monthly,
+    "yearly": _yearly,
+    "rolling": _rolling,
+    "load": _load,
+}
+
+
+class handler(JSONHandler):
+    @instrumented
     def do_GET(self):
         token = extract_token(self.headers)
         if not token:
@@ -14,126 +111,23 @@ class handler(BaseHTTPRequestHandler):
 
         params = parse_qs(urlparse(self.path).query)
         mode = params.get("mode", ["weekly"])[0]
+        try:
+            span = date_range(params)
+        except ValueError as e:
+            self._json({"error": str(e)}, 400)
+            return
 
         try:
-            activities = get_all_activities(token)
-            if mode == "weekly":
-                data = self._weekly(activities, params)
-            elif mode == "monthly":
-                data = self._monthly(activities)
-            elif mode == "yearly":
-                data = self._yearly(activities)
-            elif mode == "rolling":
-                data = self._rolling(activities, params)
-            else:
-                data = []
-            self._json(data)
+            athlete_id = sync(token)
+            etag = request_etag(self, athlete_id, data_version(athlete_id))
+            if not_modified(self, etag):
+                return
+            # default-parameter results are precomputed by the cron job
+            data = get_result(athlete_id, f"volume:{mode}") if set(params) <= {"mode"} else None
+            if data is None:
+                ctx = Context(athlete_id=athlete_id, span=span)
+                with phase("compute"):
+                    data = MODES[mode](ctx, params) if mode in MODES else []
+            self._json(data, etag=etag)
         except Exception as e:
             self._json({"error": str(e)}, 500)
-
-    def _parse(self, d):
-        return datetime.fromisoformat(d.replace("Z", "+00:00").replace("+00:00", ""))
-
-    def _weekly(self, activities, params):
-        years_str = params.get("years", [None])[0]
-        year_filter = years_str.split(",") if years_str else None
-
-        buckets = {}
-        for a in activities:
-            dt = self._parse(a["start_date_local"])
-            yr = str(dt.year)
-            if year_filter and yr not in year_filter:
-                continue
-            wk = dt.strftime("%W")
-            key = (yr, wk)
-            if key not in buckets:
-                buckets[key] = {"year": yr, "week": wk, "km": 0, "runs": 0, "time_s": 0, "elev": 0}
-            buckets[key]["km"] += a["distance"] / 1000
-            buckets[key]["runs"] += 1
-            buckets[key]["time_s"] += a.get("moving_time", 0)
-            buckets[key]["elev"] += a.get("total_elevation_gain", 0)
-
-        rows = sorted(buckets.values(), key=lambda x: (x["year"], x["week"]))
-        for r in rows:
-            r["km"] = round(r["km"], 2)
-            r["elev"] = round(r["elev"], 1)
-
-        for i, d in enumerate(rows):
-            window = rows[max(0, i - 3):i + 1]
-            d["ma_4w"] = round(sum(w["km"] for w in window) / len(window), 2)
-        return rows
-
-    def _monthly(self, activities):
-        buckets = {}
-        for a in activities:
-            dt = self._parse(a["start_date_local"])
-            key = (str(dt.year), f"{dt.month:02d}")
-            if key not in buckets:
-                buckets[key] = {"year": key[0], "month": key[1], "km": 0, "runs": 0, "time_s": 0}
-            buckets[key]["km"] += a["distance"] / 1000
-            buckets[key]["runs"] += 1
-            buckets[key]["time_s"] += a.get("moving_time", 0)
-
-        rows = sorted(buckets.values(), key=lambda x: (x["year"], x["month"]))
-        for r in rows:
-            r["km"] = round(r["km"], 2)
-        return rows
-
-    def _yearly(self, activities):
-        buckets = {}
-        for a in activities:
-            dt = self._parse(a["start_date_local"])
-            yr = str(dt.year)
-            if yr not in buckets:
-                buckets[yr] = {"year": yr, "km": 0, "runs": 0, "time_s": 0, "elev": 0}
-            buckets[yr]["km"] += a["distance"] / 1000
-            buckets[yr]["runs"] += 1
-            buckets[yr]["time_s"] += a.get("moving_time", 0)
-            buckets[yr]["elev"] += a.get("total_elevation_gain", 0)
-
-        rows = sorted(buckets.values(), key=lambda x: x["year"])
-        for r in rows:
-            r["km"] = round(r["km"], 2)
-            r["elev"] = round(r["elev"], 1)
-        return rows
-
-    def _rolling(self, activities, params):
-        days = int(params.get("days", [90])[0])
-        today = datetime.now()
-        start = today - timedelta(days=days * 2)
-
-        daily = {}
-        for a in activities:
-            dt = self._parse(a["start_date_local"])
-            if dt < start:
-                continue
-            d = dt.strftime("%Y-%m-%d")
-            daily[d] = daily.get(d, 0) + a["distance"] / 1000
-
-        result = []
-        d = start
-        while d <= today:
-            ds = d.strftime("%Y-%m-%d")
-            window_start = d - timedelta(days=days)
-            ws = window_start.strftime("%Y-%m-%d")
-            total = sum(v for k, v in daily.items() if ws <= k <= ds)
-            result.append({"date": ds, "km": round(total, 2)})
-            d += timedelta(days=1)
-        return result
-
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self._cors()
-        self.end_headers()
-
-    def _json(self, data, status=200):
-        self.send_response(status)
-        self._cors()
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
-
-    def _cors(self):
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
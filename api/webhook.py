@@ -0,0 +1,85 @@
+"""Strava push subscription endpoint.
+
+GET answers the subscription handshake (hub.challenge echo when
+hub.verify_token matches STRAVA_VERIFY_TOKEN). POST receives events:
+activity create/update/delete are queued as single-activity fetches
+(title/type updates are patched in place; a delete is applied when the
+fetch answers 404), and athlete deauthorization drops the athlete's stored
+data once Strava rejects their tokens. Events are only accepted for
+STRAVA_SUBSCRIPTION_ID; without it every POST is refused. The response is
+written before the queue is drained for up to WEBHOOK_PROCESS_BUDGET seconds.
+"""
+import os
+import json
+from urllib.parse import urlparse, parse_qs
+from api._queue import process_queue, deauthorize
+from api._response import JSONHandler
+from api._store import patch_activity, enqueue_fetch
+from api._timing import instrumented
+
+VERIFY_TOKEN = os.environ.get("STRAVA_VERIFY_TOKEN", "")
+SUBSCRIPTION_ID = os.environ.get("STRAVA_SUBSCRIPTION_ID")
+PROCESS_BUDGET = float(os.environ.get("WEBHOOK_PROCESS_BUDGET", "1.5"))
+
+
+def handle_event(event):
+    """Apply one push event to the store; returns the action taken."""
+    obj, aspect = event.get("object_type"), event.get("aspect_type")
+    owner, oid = event.get("owner_id"), event.get("object_id")
+    updates = event.get("updates") or {}
+
+    if obj == "athlete":
+        if owner is not None and str(updates.get("authorized", "")).lower() == "false":
+            return "deauthorizing"
+        return "ignored"
+    if obj != "activity" or owner is None or oid is None:
+        return "ignored"
+
+    if aspect == "update" and updates and set(updates) <= {"title", "type", "sport_type"}:
+        fields = {("name" if k == "title" else k): v for k, v in updates.items()}
+        if patch_activity(owner, oid, fields):
+            return "patched"
+    enqueue_fetch(owner, oid)
+    return "queued"
+
+
+class handler(JSONHandler):
+    methods = "GET, POST"
+
+    @instrumented
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        mode = params.get("hub.mode", [None])[0]
+        token = params.get("hub.verify_token", [None])[0]
+        challenge = params.get("hub.challenge", [None])[0]
+
+        if mode == "subscribe" and VERIFY_TOKEN and token == VERIFY_TOKEN and challenge:
+            self._json({"hub.challenge": challenge})
+        else:
+            self._json({"error": "verification failed"}, 403)
+
+    @instrumented
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            event = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            self._json({"error": "invalid json"}, 400)
+            return
+
+        if not SUBSCRIPTION_ID or str(event.get("subscription_id")) != SUBSCRIPTION_ID:
+            self._json({"error": "unknown subscription"}, 403)
+            return
+
+        try:
+            action = handle_event(event)
+        except Exception as e:
+            self._json({"error": str(e)}, 500)
+            return
+        self._json({"status": action})
+        self.wfile.flush()
+
+        if action == "queued":
+            process_queue(PROCESS_BUDGET)
+        elif action == "deauthorizing":
+            deauthorize(event["owner_id"])
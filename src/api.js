@@ -90,12 +90,80 @@ async function fetchAPI(path, options = {}) {
   return resp.json()
 }
 
+// Read an NDJSON response line by line as chunks arrive
+async function streamAPI(path, onItem) {
+  const token = await getValidToken()
+  let resp = await fetch(path, { headers: { 'Authorization': `Bearer ${token}` } })
+  if (resp.status === 401) {
+    const newToken = await refreshToken()
+    resp = await fetch(path, { headers: { 'Authorization': `Bearer ${newToken}` } })
+  }
+  if (!resp.ok) throw new Error(`API ${resp.status}`)
+  const reader = resp.body.getReader()
+  const decoder = new TextDecoder()
+  let buf = ''
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buf += decoder.decode(value, { stream: true })
+    const lines = buf.split('\n')
+    buf = lines.pop()
+    for (const line of lines) if (line) onItem(JSON.parse(line))
+  }
+  if (buf.trim()) onItem(JSON.parse(buf))
+}
+
+// --- Columnar format (same encoding as /api/activities?format=columnar) ---
+
+const DELTA_FIELDS = ['id', 'start_date_local']
+
+const toLocalSeconds = (s) => Math.floor(Date.parse(s.slice(0, 19) + 'Z') / 1000)
+const fromLocalSeconds = (sec) => new Date(sec * 1000).toISOString().slice(0, 19) + 'Z'
+
+export function decodeColumnar({ fields, columns, count, delta = [], date_base = 0 }) {
+  const cols = fields.map(f => {
+    let col = columns[f]
+    if (delta.includes(f)) {
+      let prev = f === 'start_date_local' ? date_base : 0
+      col = col.map(d => (prev += d))
+    }
+    return f === 'start_date_local' ? col.map(fromLocalSeconds) : col
+  })
+  const rows = new Array(count)
+  for (let i = 0; i < count; i++) {
+    const row = {}
+    for (let j = 0; j < fields.length; j++) {
+      if (cols[j][i] !== undefined) row[fields[j]] = cols[j][i]
+    }
+    rows[i] = row
+  }
+  return rows
+}
+
+export function encodeColumnar(activities) {
+  const rows = [...activities].sort((a, b) => toLocalSeconds(a.start_date_local) - toLocalSeconds(b.start_date_local))
+  const fields = [...new Set(rows.flatMap(Object.keys))]
+  const columns = {}
+  for (const f of fields) columns[f] = rows.map(r => r[f])
+  const dateBase = rows.length ? toLocalSeconds(rows[0].start_date_local) : 0
+  if (columns.start_date_local) columns.start_date_local = columns.start_date_local.map(toLocalSeconds)
+  const delta = DELTA_FIELDS.filter(f => columns[f])
+  for (const f of delta) {
+    let prev = f === 'start_date_local' ? dateBase : 0
+    columns[f] = columns[f].map(v => { const d = v - prev; prev = v; return d })
+  }
+  return { format: 'columnar', count: rows.length, fields, date_base: dateBase, delta, columns }
+}
+
 // --- Activity Cache ---
 
 function getCachedActivities() {
   try {
     const raw = localStorage.getItem(CACHE_KEY)
-    return raw ? JSON.parse(raw) : []
+    if (!raw) return []
+    const parsed = JSON.parse(raw)
+    // Stored columnar (oldest first); older caches hold a plain array
+    return Array.isArray(parsed) ? parsed : decodeColumnar(parsed).reverse()
   } catch { return [] }
 }
 
@@ -106,10 +174,12 @@ function getCacheMeta() {
   } catch { return null }
 }
 
+const newestFirst = (activities) => activities.sort((a, b) =>
+  new Date(b.start_date_local) - new Date(a.start_date_local)
+)
+
 function setCachedActivities(activities) {
-  const sorted = activities.sort((a, b) =>
-    new Date(b.start_date_local) - new Date(a.start_date_local)
-  )
+  const sorted = newestFirst(activities)
   // Deduplicate by id
   const seen = new Set()
   const deduped = sorted.filter(a => {
@@ -117,7 +187,7 @@ function setCachedActivities(activities) {
     seen.add(a.id)
     return true
   })
-  localStorage.setItem(CACHE_KEY, JSON.stringify(deduped))
+  localStorage.setItem(CACHE_KEY, JSON.stringify(encodeColumnar(deduped)))
   localStorage.setItem(CACHE_META_KEY, JSON.stringify({
     lastSync: Date.now(),
     count: deduped.length,
@@ -126,7 +196,7 @@ function setCachedActivities(activities) {
   return deduped
 }
 
-export async function getActivities(forceRefresh = false) {
+export async function getActivities(forceRefresh = false, onProgress = null) {
   const cached = getCachedActivities()
   const meta = getCacheMeta()
 
@@ -142,13 +212,35 @@ export async function getActivities(forceRefresh = false) {
     afterTs = Math.floor(new Date(meta.latestDate).getTime() / 1000) - 3600
   }
 
-  const url = afterTs ? `/api/activities?after=${afterTs}` : '/api/activities'
-  const result = await fetchAPI(url)
+  // Incremental refresh: a small columnar payload is enough
+  // lod0: polylines simplified server-side (~10 m tolerance), enough for the run maps
+  if (afterTs) {
+    const payload = await fetchAPI(`/api/activities?format=columnar&polyline=lod0&after=${afterTs}`)
+    return setCachedActivities([...decodeColumnar(payload), ...cached])
+  }
 
-  if (!result?.activities) throw new Error('Invalid response')
+  // First load: stream activities so the UI can render while the server sync continues
+  let streamed = await streamActivities(onProgress)
+  // the token expired during the stream: the error only reaches the trailer
+  if (streamed.trailer?.status === 401) {
+    await refreshToken()
+    streamed = await streamActivities(onProgress)
+  }
+  const { fresh, trailer } = streamed
+  if (!trailer?.done) throw new Error(trailer?.error || 'Invalid response')
+  return setCachedActivities(fresh)
+}
 
-  const merged = afterTs ? [...result.activities, ...cached] : result.activities
-  return setCachedActivities(merged)
+async function streamActivities(onProgress) {
+  const fresh = []
+  let trailer = null
+  await streamAPI('/api/activities?format=ndjson&polyline=lod0', (item) => {
+    if ('done' in item) { trailer = item; return }
+    fresh.push(item)
+    // same order as the final list
+    if (onProgress && fresh.length % 200 === 0) onProgress(newestFirst([...fresh]))
+  })
+  return { fresh, trailer }
 }
 
 export function getCacheInfo() {
@@ -161,8 +253,13 @@ export function getCacheInfo() {
   }
 }
 
+const isoDay = (t) => new Date(t).toISOString().slice(0, 10)
+const rangeQuery = (range) => range ? `&from=${isoDay(range.from)}&to=${isoDay(range.to)}` : ''
+
 // Keep the old api object for segments which still need server-side calls
 export const api = {
   localLegends: () => fetchAPI('/api/segments?mode=legends'),
   segmentPRs: () => fetchAPI('/api/segments?mode=starred'),
+  // range: { from, to } timestamps, as in ActivityContext's dateRange
+  dashboard: (sections, range) => fetchAPI(`/api/dashboard?sections=${sections.join(',')}${rangeQuery(range)}`),
 }
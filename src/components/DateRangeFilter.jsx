@@ -1,6 +1,7 @@
 import React, { useState, useMemo, useCallback, useRef, useEffect } from 'react'
 import { Calendar } from 'lucide-react'
 import { useActivities } from '../contexts/ActivityContext'
+import { rangeCount } from '../lib/compute'
 
 const PRESETS = [
   { label: '7j', days: 7 },
@@ -92,14 +93,14 @@ function DualSlider({ min, max, valueFrom, valueTo, onChange }) {
 }
 
 export default function DateRangeFilter() {
-  const { allActivities, dateRange, setDateRange } = useActivities()
+  const { allActivities, dateRange, setDateRange, timeline } = useActivities()
   const [expanded, setExpanded] = useState(false)
 
   const bounds = useMemo(() => {
-    if (!allActivities.length) return { min: Date.now() - 365 * 86400000, max: Date.now() }
-    const dates = allActivities.map(a => new Date(a.start_date_local).getTime())
-    return { min: Math.min(...dates), max: Math.max(...dates) }
-  }, [allActivities])
+    const { times } = timeline
+    if (!times.length) return { min: Date.now() - 365 * 86400000, max: Date.now() }
+    return { min: times[0], max: times[times.length - 1] }
+  }, [timeline])
 
   const activePreset = useMemo(() => {
     if (!dateRange) return 'Tout'
@@ -134,12 +135,9 @@ export default function DateRangeFilter() {
     : 'Toutes les donnees'
 
   const filteredCount = useMemo(() => {
-    if (!dateRange || !allActivities.length) return allActivities.length
-    return allActivities.filter(a => {
-      const t = new Date(a.start_date_local).getTime()
-      return t >= dateRange.from && t <= dateRange.to
-    }).length
-  }, [allActivities, dateRange])
+    if (!dateRange) return allActivities.length
+    return rangeCount(timeline, dateRange.from, dateRange.to)
+  }, [allActivities, timeline, dateRange])
 
   if (!allActivities.length) return null
 
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useState, useCallback, useEffect, useMemo } from 'react'
 import { getActivities, getCacheInfo, isAuthenticated } from '../api'
+import { buildTimeline, filterRange } from '../lib/compute'
 
 const ActivityContext = createContext(null)
 
@@ -17,7 +18,10 @@ export function ActivityProvider({ children }) {
       if (force) setSyncing(true)
       else setLoading(true)
       setError(null)
-      const acts = await getActivities(force)
+      const acts = await getActivities(force, (partial) => {
+        setAllActivities(partial)
+        setLoading(false)
+      })
       setAllActivities(acts)
       setCacheInfo(getCacheInfo())
     } catch (e) {
@@ -30,20 +34,20 @@ export function ActivityProvider({ children }) {
 
   useEffect(() => { load() }, [load])
 
-  // Filtered activities based on date range
+  // Sorted start times, rebuilt only when the list changes
+  const timeline = useMemo(() => buildTimeline(allActivities), [allActivities])
+
+  // Filtered activities based on date range (binary search over the timeline)
   const activities = useMemo(() => {
     if (!dateRange) return allActivities
-    return allActivities.filter(a => {
-      const t = new Date(a.start_date_local).getTime()
-      return t >= dateRange.from && t <= dateRange.to
-    })
-  }, [allActivities, dateRange])
+    return filterRange(allActivities, timeline, dateRange.from, dateRange.to)
+  }, [allActivities, timeline, dateRange])
 
   return (
     <ActivityContext.Provider value={{
       activities, allActivities, loading, error, syncing,
       refresh: () => load(true), cacheInfo,
-      dateRange, setDateRange
+      dateRange, setDateRange, timeline
     }}>
       {children}
     </ActivityContext.Provider>
@@ -392,3 +392,35 @@ export function getAllYears(activities) {
   activities.forEach(a => years.add(String(parseDate(a.start_date_local).getFullYear())))
   return [...years].sort()
 }
+
+// --- Date index ---
+// Start times parsed once per activity list and sorted, so a date range is two
+// binary searches instead of a Date parse per activity on every range change.
+
+export function buildTimeline(activities) {
+  const times = activities.map(a => new Date(a.start_date_local).getTime())
+  const order = Int32Array.from(times.keys()).sort((i, j) => times[i] - times[j])
+  return { times: Float64Array.from(order, i => times[i]), order }
+}
+
+// first index whose time is >= t (> t when `after`)
+function bisect(times, t, after = false) {
+  let lo = 0, hi = times.length
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1
+    if (times[mid] < t || (after && times[mid] === t)) lo = mid + 1
+    else hi = mid
+  }
+  return lo
+}
+
+export function rangeCount(timeline, from, to) {
+  return Math.max(0, bisect(timeline.times, to, true) - bisect(timeline.times, from))
+}
+
+export function filterRange(activities, timeline, from, to) {
+  const lo = bisect(timeline.times, from)
+  const hi = Math.max(lo, bisect(timeline.times, to, true))
+  // back to the list's own order
+  return Array.from(timeline.order.slice(lo, hi).sort(), i => activities[i])
+}
@@ -39,6 +39,10 @@ export default function Segments() {
                 </div>
               ))}
             </div>
+          ) : legends.rate_limited ? (
+            <p className="text-sm text-gray-500">
+              Quota Strava atteint, reessayez dans {Math.ceil(legends.retry_after / 60)} min.
+            </p>
           ) : (
             <p className="text-sm text-gray-500">Aucune Local Legend. Lancez un sync + snapshot.</p>
           )}
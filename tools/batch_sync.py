@@ -0,0 +1,82 @@
+"""Sync every stored athlete (a club) outside Vercel over a worker pool.
+
+    python tools/batch_sync.py --workers 8 --budget 600
+    python tools/batch_sync.py --athletes 12,34 --no-details --no-precompute
+    python tools/batch_sync.py --shard 0/2          # this process: athlete_id % 2 == 0
+    python tools/batch_sync.py --fake 20 --activities 1500 --latency 80 --rate-limit 600,30000
+
+Uses the store configured for the API (SQLITE_PATH, TURSO_DATABASE_URL) and
+the athletes' stored refresh tokens (api/_batch.py). --fake N instead starts
+tools/fake_strava.py in-process and registers N athletes in a temporary
+store, to measure the engine. The report gives per-athlete entries,
+activities/s and Strava calls/s.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None, help="threads (default SYNC_WORKERS or 4)")
+    parser.add_argument("--budget", type=float, default=600.0, help="seconds for the whole batch")
+    parser.add_argument("--athletes", default=None, help="comma-separated athlete ids (default: all stored)")
+    parser.add_argument("--shard", default=None, help="I/N: only athletes with athlete_id %% N == I")
+    parser.add_argument("--detail-budget", type=float, default=None, help="seconds of detail fetches per athlete")
+    parser.add_argument("--no-details", action="store_true")
+    parser.add_argument("--no-precompute", action="store_true")
+    parser.add_argument("--fake", type=int, default=0, help="sync N fake athletes against a local fake Strava")
+    parser.add_argument("--activities", type=int, default=1000, help="activities per fake athlete")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Strava latency (ms)")
+    parser.add_argument("--rate-limit", default="600,30000", help="fake Strava short,daily limits")
+    parser.add_argument("--json", action="store_true", help="print the whole report as JSON")
+    args = parser.parse_args(argv)
+
+    fake = None
+    if args.fake:
+        from tools.fake_strava import FakeStrava
+        short, daily = (int(x) for x in args.rate_limit.split(","))
+        fake = FakeStrava(activities=args.activities, latency_ms=args.latency, short_limit=short, daily_limit=daily)
+        # must be set before the api modules are imported
+        os.environ["STRAVA_BASE_URL"] = fake.start()
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "batch.db")
+        os.environ.setdefault("STRAVA_RATE_SHORT", str(short))
+        os.environ.setdefault("STRAVA_RATE_DAILY", str(daily))
+    os.environ.setdefault("REQUEST_LOG", "0")
+
+    from api._batch import run_batch, SYNC_WORKERS, DETAIL_BUDGET
+    from api._store import save_tokens
+
+    if fake:
+        for athlete_id in range(1, args.fake + 1):
+            save_tokens(athlete_id, f"fake-{athlete_id}", f"fake-{athlete_id}", time.time() + 6 * 3600)
+            fake.data(athlete_id)  # generated up front, not under the fake's lock during the run
+    shard = tuple(int(x) for x in args.shard.split("/")) if args.shard else None
+    detail_budget = 0 if args.no_details else (DETAIL_BUDGET if args.detail_budget is None else args.detail_budget)
+    report = run_batch(
+        [int(a) for a in args.athletes.split(",")] if args.athletes else None,
+        workers=args.workers or SYNC_WORKERS, time_budget=args.budget, detail_budget=detail_budget,
+        results=not args.no_precompute, shard=shard,
+    )
+    if fake:
+        fake.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+    for e in report["athletes"]:
+        status = e.get("error") or (f"{e['activities']} activities, {e['pages']} pages"
+                                    + ("" if e["complete"] else " (incomplete)"))
+        print(f"{e['athlete_id']:>10} {e['ms']:>10.0f} ms  {status}")
+    print(f"{report['processed']} athletes synced, {report['skipped']} skipped, {report['workers']} workers, "
+          f"{report['duration_ms'] / 1000:.1f} s: {report['activities']} activities "
+          f"({report['activities_per_s']}/s), {report['strava_calls']} Strava calls ({report['calls_per_s']}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Benchmark every compute path on synthetic data and compare with a baseline.
+
+    python tools/bench_compute.py                      # 1k,10k,100k vs stored baseline
+    python tools/bench_compute.py --sizes 1k,10k
+    python tools/bench_compute.py --update             # rewrite the baseline
+
+Each handler mode runs on a fresh Context (frame, PRs and daily series
+included, as in one request), once on the activity list and once as
+"store:<mode>" on a temporary SQLite store, where buckets, PRs and training
+load come from the materialized aggregates as in production and
+analysis:streams reads STREAM_RUNS stored streams. Wall time is the best of
+--repeat runs (more for short cases, until MIN_MEASURE_S is spent), peak
+memory comes from a separate tracemalloc run. Baselines are kept per backend
+(numpy or array fallback) in bench_baseline.json.
+
+A case regresses when its time exceeds the baseline by more than
+--time-tolerance (and by at least MIN_DELTA_MS), when its peak memory
+exceeds it by more than --memory-tolerance, or when its growth between
+consecutive sizes worsens by more than --time-tolerance; the last check
+catches complexity changes such as an O(n^2) loop and depends less on the
+machine's speed, but only applies when the smaller size takes at least
+MIN_GROWTH_MS (below that, fixed overhead and noise dominate the ratio).
+Exits with status 1 on any regression or when the backend has no baseline.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import zlib
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# never the configured store: synthetic athletes go to a throwaway database
+TMP = tempfile.mkdtemp()
+os.environ["SQLITE_PATH"] = os.path.join(TMP, "bench.db")
+os.environ["STREAM_DIR"] = os.path.join(TMP, "streams")
+
+from api import analysis, cockpit, performance, volume, _streams  # noqa: E402
+from api._context import Context  # noqa: E402
+from api._frame import ActivityFrame, np  # noqa: E402
+from api._store import (upsert_activities, put_streams, load_runs, load_buckets, load_prs,  # noqa: E402
+                        load_training)
+from api._utils import compute_prs  # noqa: E402
+from tools.synthetic import generate, parse_size, streams  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+TODAY = date(2025, 6, 30)
+MIN_DELTA_MS = 5.0
+MIN_GROWTH_MS = 20.0
+MIN_MEASURE_S = 1.0
+MAX_RUNS = 200
+STREAM_RUNS = 100  # analysis:streams default limit
+MODULES = (("cockpit", cockpit.MODES), ("volume", volume.MODES),
+           ("performance", performance.MODES), ("analysis", analysis.MODES))
+
+
+def seed(athlete_id, acts):
+    """Store `acts` and the streams of the latest long runs; builds the aggregate tables."""
+    upsert_activities(athlete_id, acts)
+    long_runs = [a for a in acts if a["type"] == "Run" and a["distance"] >= 10000][-STREAM_RUNS:]
+    rows = []
+    for a in long_runs:
+        buf = _streams.pack(streams(a, resolution=5))
+        rows.append((a["id"], zlib.compress(buf, 6), _streams.metrics(_streams.Stream(buf))))
+    put_streams(athlete_id, rows)
+    load_buckets(athlete_id, "week")
+
+
+def cases(athlete_id):
+    """{name: fn(runs)} for every handler mode, on the list and on the store, plus the building blocks."""
+    out = {
+        "frame": lambda runs: ActivityFrame(runs),
+        "compute_prs": lambda runs: compute_prs(ActivityFrame(runs)),
+        "store:load_runs": lambda runs: load_runs(athlete_id),
+        "store:load_buckets": lambda runs: [load_buckets(athlete_id, p) for p in ("week", "month", "year")],
+        "store:load_prs": lambda runs: load_prs(athlete_id),
+        "store:load_training": lambda runs: load_training(athlete_id),
+    }
+    for module, modes in MODULES:
+        for mode, fn in modes.items():
+            # streams are only read from the store
+            if (module, mode) != ("analysis", "streams"):
+                out[f"{module}:{mode}"] = lambda runs, fn=fn: fn(Context(runs, today=TODAY), {})
+    for module, modes in MODULES:
+        for mode, fn in modes.items():
+            out[f"store:{module}:{mode}"] = \
+                lambda runs, fn=fn: fn(Context(athlete_id=athlete_id, today=TODAY), {})
+    return out
+
+
+def measure(fn, runs, repeat):
+    best, spent, n = float("inf"), 0.0, 0
+    # short cases repeat for MIN_MEASURE_S so the best run outlasts slow spells of a shared machine
+    while n < repeat or (spent < MIN_MEASURE_S and n < MAX_RUNS):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn(runs)
+        elapsed = time.perf_counter() - t0
+        best, spent, n = min(best, elapsed), spent + elapsed, n + 1
+    gc.collect()
+    tracemalloc.start()
+    fn(runs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms": round(best * 1000, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def run(sizes, repeat, only=None):
+    results = {}
+    for athlete_id, label in enumerate(sizes, 1):
+        acts = generate(parse_size(label), end=TODAY, polylines=False)
+        runs = [a for a in acts if a["type"] == "Run"]
+        seed(athlete_id, acts)
+        results[label] = {}
+        for name, fn in cases(athlete_id).items():
+            if only and name not in only:
+                continue
+            results[label][name] = m = measure(fn, runs, repeat)
+            print(f"{label:>5} {name:<26} {m['ms']:>10.2f} ms {m['peak_kb']:>10.0f} KiB", flush=True)
+    return results
+
+
+def compare(results, baseline, time_tol, memory_tol):
+    """Regression messages for results against the stored baseline."""
+    problems = []
+    labels = list(results)
+    for label, cases_ in results.items():
+        for name, m in cases_.items():
+            b = baseline.get(label, {}).get(name)
+            if not b:
+                continue
+            if m["ms"] > b["ms"] * (1 + time_tol) and m["ms"] - b["ms"] > MIN_DELTA_MS:
+                problems.append(f"{label} {name}: {m['ms']:.1f} ms vs baseline {b['ms']:.1f} ms")
+            if m["peak_kb"] > b["peak_kb"] * (1 + memory_tol) and m["peak_kb"] - b["peak_kb"] > 64:
+                problems.append(f"{label} {name}: {m['peak_kb']:.0f} KiB vs baseline {b['peak_kb']:.0f} KiB")
+    # growth between consecutive sizes
+    for small, large in zip(labels, labels[1:]):
+        for name in results[large]:
+            try:
+                got_small, ref_small = results[small][name]["ms"], baseline[small][name]["ms"]
+                got = results[large][name]["ms"] / got_small
+                ref = baseline[large][name]["ms"] / ref_small
+            except KeyError:
+                continue
+            if min(got_small, ref_small) < MIN_GROWTH_MS:
+                continue
+            if got > ref * (1 + time_tol) and results[large][name]["ms"] > MIN_DELTA_MS:
+                problems.append(f"{name}: {small}->{large} grows x{got:.1f} vs x{ref:.1f} in baseline")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,10k,100k")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="comma-separated case names")
+    parser.add_argument("--update", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    backend = "numpy" if np is not None else "array"
+    sizes = args.sizes.split(",")
+    results = run(sizes, args.repeat, set(args.only.split(",")) if args.only else None)
+
+    stored = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            stored = json.load(f)
+
+    if args.update:
+        merged = stored.get(backend, {})
+        for label, cases_ in results.items():
+            merged.setdefault(label, {}).update(cases_)
+        stored[backend] = merged
+        with open(BASELINE, "w") as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+        print(f"baseline updated ({backend})")
+        return 0
+
+    if backend not in stored:
+        print(f"no {backend} baseline, run with --update first")
+        return 1
+    problems = compare(results, stored[backend], args.time_tolerance, args.memory_tolerance)
+    for p in problems:
+        print(f"REGRESSION {p}")
+    print(f"{len(problems)} regression(s) against the {backend} baseline")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Payload and decode-time comparison of raw vs simplified polylines.
+
+    python tools/bench_polyline.py                 # 500 synthetic runs
+    python tools/bench_polyline.py --runs 2000
+    python tools/bench_polyline.py --athlete 42    # stored activities (SQLITE_PATH)
+
+Decode time is measured with the Python decoder, a proxy for the browser's
+decodePolyline in RunMap.jsx (same algorithm, linear in string length).
+"""
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api import _polyline  # noqa: E402
+
+
+def synthetic_polylines(runs, seed=1):
+    """Random-walk GPS tracks shaped like Strava summary polylines (~15 m steps)."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(runs):
+        lat, lng = 48.85 + rng.uniform(-0.05, 0.05), 2.35 + rng.uniform(-0.05, 0.05)
+        heading = rng.uniform(0, 2 * math.pi)
+        points = []
+        for _ in range(rng.randint(200, 900)):
+            heading += rng.gauss(0, 0.15)
+            step = 15 + rng.uniform(-3, 3)
+            lat += step * math.cos(heading) / 111320
+            lng += step * math.sin(heading) / (111320 * math.cos(math.radians(lat)))
+            points.append((round(lat * 1e5), round(lng * 1e5)))
+        out.append(_polyline.encode_ints(points))
+    return out
+
+
+def stored_polylines(athlete_id):
+    from api._store import load_runs
+    return [p for p in ((a.get("map") or {}).get("summary_polyline") for a in load_runs(athlete_id)) if p]
+
+
+def _timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--athlete", type=int)
+    args = parser.parse_args(argv)
+
+    raw = stored_polylines(args.athlete) if args.athlete else synthetic_polylines(args.runs)
+    if not raw:
+        print("no polylines")
+        return
+
+    t0 = time.perf_counter()
+    levels = [_polyline.levels(p) for p in raw]
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    variants = {"raw": raw, **{name: [lv[name] for lv in levels] for name in _polyline.LEVELS}}
+    raw_bytes = sum(len(p) for p in raw)
+    print(f"{len(raw)} polylines, levels built in {build_ms:.0f} ms ({build_ms / len(raw):.2f} ms each, cached)")
+    print(f"{'level':<6} {'bytes':>10} {'saved':>7} {'points':>9} {'decode ms':>10}")
+    for name, polylines in variants.items():
+        size = sum(len(p) for p in polylines)
+        points = sum(len(_polyline.decode_ints(p)) for p in polylines)
+        decode_ms = _timed(lambda: [_polyline.decode(p) for p in polylines])
+        print(f"{name:<6} {size:>10} {(1 - size / raw_bytes) * 100:>6.1f}% {points:>9} {decode_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
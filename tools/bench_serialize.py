@@ -0,0 +1,153 @@
+"""Benchmark the JSON response path on the largest payloads.
+
+    python tools/bench_serialize.py                 # 1k,10k activities
+    python tools/bench_serialize.py --sizes 1k,10k,100k --repeat 5
+
+Payloads: /api/activities rows (raw polylines, no polylines, columnar) and
+/api/volume?mode=rolling with three windows. Each is serialized by the
+previous path (stdlib json.dumps, one send_header call per header line) and
+by api._response.send_json with the stdlib fallback and with orjson when it
+is installed. The rolling payload is also rebuilt the previous way (one
+round() per dict entry) against the column-wise volume._rolling. Reported
+numbers are the best of --repeat runs and the tracemalloc peak of one run.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+import email.message
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api import _response, activities, volume  # noqa: E402
+from api._context import Context  # noqa: E402
+from api._frame import from_day  # noqa: E402
+from tools.synthetic import generate, parse_size  # noqa: E402
+
+TODAY = date(2025, 6, 30)
+ROLLING = {"days": ["7,28,365"]}
+
+
+class Sink:
+    """Socket-like wfile: counts bytes without keeping a copy (BytesIO would add one)."""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return len(data)
+
+
+class NullHandler(_response.JSONHandler):
+    """Handler writing into a Sink, without a socket or request parsing."""
+
+    def __init__(self):
+        self.path, self.command, self.request_version = "/bench", "GET", "HTTP/1.1"
+        self.requestline = "GET /bench HTTP/1.1"
+        self.headers = email.message.Message()
+        self.headers["Accept-Encoding"] = "identity"
+        self.wfile = Sink()
+
+    def log_request(self, *args):
+        pass
+
+
+def legacy_send(handler, data):
+    """The response path before the shared base: stdlib dumps and per-line headers."""
+    body = json.dumps(data).encode()
+    handler.send_response(200)
+    handler.send_header("Access-Control-Allow-Origin", "*")
+    handler.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
+    handler.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization, If-None-Match")
+    handler.send_header("Access-Control-Expose-Headers", "ETag, Server-Timing")
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.send_header("ETag", '"bench"')
+    handler.send_header("Cache-Control", "max-age=0, s-maxage=60, stale-while-revalidate=300")
+    handler.send_header("Vary", "Authorization, Accept-Encoding")
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def legacy_rolling(ctx, params):
+    windows = [int(w) for w in params.get("days", ["90"])[0].split(",")]
+    start = ctx.today_day - max(windows) * 2
+    sums = ctx.daily.rolling_many([w + 1 for w in windows], start, ctx.today_day)
+    dates = [from_day(d).isoformat() for d in range(start, ctx.today_day + 1)]
+    return [{"date": ds, **{f"km_{w}": round(sums[w + 1][i] / 1000, 2) for w in windows}}
+            for i, ds in enumerate(dates)]
+
+
+def payloads(n):
+    acts = [a for a in generate(n, end=TODAY) if a["type"] == "Run"]
+    rows = [activities._transform(a) for a in acts]
+    bare = [activities._transform(a, "none") for a in acts]
+    return {
+        "activities": {"activities": rows, "count": len(rows)},
+        "activities_nopoly": {"activities": bare, "count": len(bare)},
+        "columnar": activities._columnar(bare, None),
+        "rolling": volume._rolling(Context(acts, today=TODAY), ROLLING),
+    }, acts
+
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms": round(best * 1000, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def send(data, orjson_enabled):
+    saved = _response.orjson
+    _response.orjson = saved if orjson_enabled else None
+    try:
+        _response.send_json(NullHandler(), data, etag="bench")
+    finally:
+        _response.orjson = saved
+
+
+def run(sizes, repeat):
+    results = {}
+    for label in sizes:
+        data, acts = payloads(parse_size(label))
+        results[label] = r = {}
+        for name, payload in data.items():
+            r[f"{name}:legacy"] = measure(lambda: legacy_send(NullHandler(), payload), repeat)
+            r[f"{name}:stdlib"] = measure(lambda: send(payload, False), repeat)
+            if _response.orjson is not None:
+                r[f"{name}:orjson"] = measure(lambda: send(payload, True), repeat)
+        ctx = Context(acts, today=TODAY)
+        ctx.daily
+        r["rolling_build:legacy"] = measure(lambda: legacy_rolling(ctx, ROLLING), repeat)
+        r["rolling_build:columns"] = measure(lambda: volume._rolling(ctx, ROLLING), repeat)
+        for name, m in r.items():
+            print(f"{label:>5} {name:<28} {m['ms']:>10.2f} ms {m['peak_kb']:>10.0f} KiB", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,10k")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+    results = run(args.sizes.split(","), args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark the stream cache and stream metrics on synthetic long runs.
+
+    python tools/bench_streams.py                  # 300 long runs
+    python tools/bench_streams.py --runs 500 --min-km 15
+
+Streams come from tools/synthetic.streams (1 Hz). The report gives the
+storage size per sample (JSON, packed, packed + zlib), the time to pack and
+store every stream, the metrics computed from the memory-mapped files (cold:
+cached metrics dropped) and the repeat analysis served from cached metrics.
+Everything runs against a temporary SQLite store and STREAM_DIR.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault("SQLITE_PATH", os.path.join(TMP, "streams.db"))
+os.environ.setdefault("STREAM_DIR", os.path.join(TMP, "streams"))
+
+from api import _streams  # noqa: E402
+from api._frame import np  # noqa: E402
+from api._store import db, put_streams, stream_path  # noqa: E402
+from tools.synthetic import generate, streams  # noqa: E402
+
+ATHLETE = 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=300)
+    parser.add_argument("--min-km", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    long_runs = [a for a in generate(args.runs * 6, polylines=False)
+                 if a["type"] == "Run" and a["distance"] >= args.min_km * 1000][-args.runs:]
+    raw = {a["id"]: streams(a) for a in long_runs}
+    ids = list(raw)
+    samples = sum(len(s["time"]["data"]) for s in raw.values())
+
+    t0 = time.perf_counter()
+    packed = {aid: _streams.pack(s) for aid, s in raw.items()}
+    t_pack = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    rows = []
+    for aid, buf in packed.items():
+        _streams._write(stream_path(ATHLETE, aid), buf)
+        rows.append((aid, zlib.compress(buf, 6), _streams.metrics(_streams.Stream(buf))))
+    put_streams(ATHLETE, rows)
+    t_store = time.perf_counter() - t0
+
+    json_bytes = sum(len(json.dumps(s)) for s in raw.values())
+    packed_bytes = sum(len(b) for b in packed.values())
+    stored_bytes = sum(len(r[1]) for r in rows)
+
+    # cold: stale metrics force a recompute from the memory-mapped files
+    db().execute("UPDATE streams SET metrics = '{\"version\": 0}' WHERE athlete_id = ?", (ATHLETE,))
+    t0 = time.perf_counter()
+    cold = _streams.analyze(ATHLETE, ids)
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    warm = _streams.analyze(ATHLETE, ids)
+    t_warm = time.perf_counter() - t0
+    assert cold == warm and len(warm) == len(ids)
+
+    print(f"{len(ids)} runs, {samples} samples, backend {'numpy' if np is not None else 'array'}")
+    print(f"bytes/sample: json {json_bytes / samples:.1f}, packed {packed_bytes / samples:.1f}, "
+          f"stored (zlib) {stored_bytes / samples:.1f}")
+    print(f"pack {t_pack * 1000:.0f} ms, store + metrics {t_store * 1000:.0f} ms")
+    print(f"analyze cold (mmap + metrics) {t_cold * 1000:.0f} ms, repeat (cached) {t_warm * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
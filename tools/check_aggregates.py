@@ -0,0 +1,30 @@
+"""Compare the materialized aggregates with a full recompute.
+
+    python tools/check_aggregates.py            # every athlete with stored tokens
+    python tools/check_aggregates.py 42 1337    # given athletes
+
+Exits with status 1 if any athlete's tables differ.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api._store import check_aggregates, list_athletes  # noqa: E402
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    athletes = [int(a) for a in argv] or list_athletes()
+    failed = 0
+    for athlete_id in athletes:
+        problems = check_aggregates(athlete_id)
+        print(f"{athlete_id}: {'ok' if not problems else f'{len(problems)} problem(s)'}")
+        for p in problems:
+            print(f"  {p}")
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
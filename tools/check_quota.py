@@ -0,0 +1,62 @@
+"""Check that background detail fetches leave room for the athlete's next sync.
+
+    python tools/check_quota.py
+    python tools/check_quota.py --activities 2000 --rate-limit 200,2000
+
+Runs against tools/fake_strava.py in-process and a temporary store: a full
+sync, then fetch_details with a generous time budget, then the sync step an
+interactive sync() makes, which must succeed without RateLimitExceeded (sync()
+itself would fall back to the stored activities). Exits with status 1
+otherwise.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+ATHLETE = 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--activities", type=int, default=1000, help="activities of the fake athlete")
+    parser.add_argument("--rate-limit", default="200,2000", help="fake Strava short,daily limits")
+    args = parser.parse_args(argv)
+
+    from tools.fake_strava import FakeStrava
+    short, daily = (int(x) for x in args.rate_limit.split(","))
+    fake = FakeStrava(activities=args.activities, short_limit=short, daily_limit=daily)
+    # must be set before the api modules are imported
+    os.environ["STRAVA_BASE_URL"] = fake.start()
+    os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "quota.db")
+    os.environ["STRAVA_RATE_SHORT"] = str(short)
+    os.environ["STRAVA_RATE_DAILY"] = str(daily)
+    os.environ.setdefault("REQUEST_LOG", "0")
+
+    from api._details import fetch_details
+    from api._ratelimit import INTERACTIVE, RateLimitExceeded, budget
+    from api._store import save_tokens, sync_step
+    from api._utils import token_key
+
+    token = f"fake-{ATHLETE}"
+    save_tokens(ATHLETE, token, token, time.time() + 6 * 3600)
+    try:
+        sync_step(token, ATHLETE)
+        details = fetch_details(token, ATHLETE, time_budget=60)
+        b = budget(token_key(token))
+        print(f"details: {details}, athlete calls left {b['athlete']['remaining']}, tokens {b['tokens']}")
+        sync_step(token, ATHLETE, priority=INTERACTIVE)
+    except RateLimitExceeded as e:
+        print(f"FAIL: interactive sync after fetch_details: {e}")
+        return 1
+    finally:
+        fake.stop()
+    print("ok: interactive sync after fetch_details")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Local stand-in for the Strava API, backed by tools/synthetic.py data.
+
+    python tools/fake_strava.py --port 8765 --activities 2000 --latency 80 --error-rate 0.01
+    STRAVA_BASE_URL=http://127.0.0.1:8765 vercel dev
+
+Serves /api/v3/athlete, /athlete/activities (paginated, `after`/`before`),
+/activities/{id} (with best_efforts), /activities/{id}/streams,
+/segments/starred, /segments/{id} and
+POST /oauth/token. Access tokens look like "fake-<athlete_id>"; any refresh
+token or code "fake-<athlete_id>" is accepted. Every API response carries
+X-RateLimit-Limit/Usage for 15-minute and daily windows, and 429s once a
+limit is used up. GET /_stats returns call counts (total and per token).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.synthetic import generate, streams  # noqa: E402
+
+BEST_EFFORTS = [("400m", 400), ("1k", 1000), ("1 mile", 1609), ("5k", 5000), ("10k", 10000),
+                ("Half-Marathon", 21097), ("Marathon", 42195)]
+
+
+def _epoch(iso):
+    return int(datetime.strptime(iso, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp())
+
+
+class FakeStrava:
+    """Generated data plus the knobs (latency, errors, rate limits) shared by all requests."""
+
+    def __init__(self, activities=1000, segments=60, latency_ms=0.0, jitter_ms=None, error_rate=0.0,
+                 short_limit=200, daily_limit=2000, seed=1):
+        self.n_activities = activities
+        self.n_segments = segments
+        self.latency = latency_ms / 1000
+        self.jitter = (latency_ms / 2 if jitter_ms is None else jitter_ms) / 1000
+        self.error_rate = error_rate
+        self.limits = (short_limit, daily_limit)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.athletes = {}
+        self.calls = {"total": 0, "errors": 0, "rate_limited": 0, "by_token": {}, "by_path": {}}
+        self.window = {"short": (0, 0), "daily": (0, 0)}
+        self.server = None
+
+    # --- data ---
+
+    def data(self, athlete_id):
+        with self.lock:
+            if athlete_id not in self.athletes:
+                acts = generate(self.n_activities, seed=athlete_id)
+                self.athletes[athlete_id] = {
+                    "activities": acts,
+                    "by_id": {a["id"]: a for a in acts},
+                    "epochs": [_epoch(a["start_date"]) for a in acts],
+                }
+            return self.athletes[athlete_id]
+
+    def segment(self, sid):
+        r = random.Random(sid)
+        return {
+            "id": sid, "name": f"Segment {sid}", "distance": round(r.uniform(300, 5000), 1),
+            "average_grade": round(r.uniform(-3, 8), 1), "city": "Paris",
+            "athlete_segment_stats": {"pr_elapsed_time": r.randint(60, 1200), "effort_count": r.randint(1, 80)},
+            "local_legend": {"is_local_legend": r.random() < 0.2, "effort_count": r.randint(1, 40)},
+        }
+
+    # --- accounting ---
+
+    def _usage(self):
+        """Advance the 15-minute/daily windows and count one call; returns (short, daily) usage."""
+        now = int(time.time())
+        short_start, short_used = self.window["short"]
+        daily_start, daily_used = self.window["daily"]
+        if now - short_start >= 900:
+            short_start, short_used = now - now % 900, 0
+        if now - daily_start >= 86400:
+            daily_start, daily_used = now - now % 86400, 0
+        self.window = {"short": (short_start, short_used + 1), "daily": (daily_start, daily_used + 1)}
+        return short_used + 1, daily_used + 1
+
+    def account(self, token, path):
+        with self.lock:
+            self.calls["total"] += 1
+            self.calls["by_token"][token] = self.calls["by_token"].get(token, 0) + 1
+            key = "/".join("{id}" if part.isdigit() else part for part in path.split("/"))
+            self.calls["by_path"][key] = self.calls["by_path"].get(key, 0) + 1
+            usage = self._usage()
+            fail = self.rng.random() < self.error_rate
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter)) if self.latency else 0.0
+        return usage, fail, delay
+
+    def stats(self):
+        with self.lock:
+            return json.loads(json.dumps(self.calls))
+
+    # --- server ---
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve in a background thread; returns the base URL (for STRAVA_BASE_URL)."""
+        self.server = ThreadingHTTPServer((host, port), type("Handler", (_Handler,), {"fake": self}))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, data, usage=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if usage:
+            self.send_header("X-RateLimit-Limit", f"{self.fake.limits[0]},{self.fake.limits[1]}")
+            self.send_header("X-RateLimit-Usage", f"{usage[0]},{usage[1]}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _athlete(self, token):
+        try:
+            return int(token.removeprefix("fake-"))
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/_stats":
+            self._send(200, self.fake.stats())
+            return
+        if not url.path.startswith("/api/v3/"):
+            self._send(404, {"message": "Record Not Found"})
+            return
+
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        athlete_id = self._athlete(token)
+        path = url.path[len("/api/v3"):]
+        usage, fail, delay = self.fake.account(token, path)
+        if delay:
+            time.sleep(delay)
+        if athlete_id is None:
+            self._send(401, {"message": "Authorization Error"}, usage)
+            return
+        if usage[0] > self.fake.limits[0] or usage[1] > self.fake.limits[1]:
+            with self.fake.lock:
+                self.fake.calls["rate_limited"] += 1
+            self._send(429, {"message": "Rate Limit Exceeded"}, usage)
+            return
+        if fail:
+            with self.fake.lock:
+                self.fake.calls["errors"] += 1
+            self._send(500, {"message": "Internal Server Error"}, usage)
+            return
+
+        status, data = self.route(athlete_id, path, q)
+        self._send(status, data, usage)
+
+    def route(self, athlete_id, path, q):
+        page, per_page = int(q.get("page", 1)), min(int(q.get("per_page", 30)), 200)
+        if path == "/athlete":
+            return 200, {"id": athlete_id, "firstname": "Fake", "lastname": str(athlete_id)}
+        if path == "/athlete/activities":
+            d = self.fake.data(athlete_id)
+            after, before = int(q.get("after", 0)), int(q.get("before", 2 ** 40))
+            acts = [a for a, e in zip(d["activities"], d["epochs"]) if after < e < before]
+            if "after" not in q:
+                acts = acts[::-1]
+            return 200, acts[(page - 1) * per_page:page * per_page]
+        if path.startswith("/activities/") and path.endswith("/streams"):
+            a = self.fake.data(athlete_id)["by_id"].get(int(path.split("/")[2]))
+            if a is None:
+                return 404, {"message": "Record Not Found"}
+            keys = set(q.get("keys", "time").split(",")) | {"time"}
+            return 200, {k: v for k, v in streams(a).items() if k in keys}
+        if path.startswith("/activities/"):
+            a = self.fake.data(athlete_id)["by_id"].get(int(path.rsplit("/", 1)[1]))
+            if a is None:
+                return 404, {"message": "Record Not Found"}
+            detail = dict(a)
+            speed = a["average_speed"] or 1
+            detail["best_efforts"] = [
+                {"name": name, "distance": dist, "elapsed_time": int(dist / speed * 0.98),
+                 "moving_time": int(dist / speed * 0.98), "start_date_local": a["start_date_local"]}
+                for name, dist in BEST_EFFORTS if a["type"] == "Run" and dist <= a["distance"]
+            ]
+            return 200, detail
+        if path == "/segments/starred":
+            ids = range(1, self.fake.n_segments + 1)
+            return 200, [{"id": i, "name": f"Segment {i}"} for i in ids][(page - 1) * per_page:page * per_page]
+        if path.startswith("/segments/"):
+            return 200, self.fake.segment(int(path.rsplit("/", 1)[1]))
+        return 404, {"message": "Record Not Found"}
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/oauth/token":
+            self._send(404, {"message": "Record Not Found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        grant = form.get("refresh_token") or form.get("code") or ""
+        athlete_id = self._athlete(grant)
+        if athlete_id is None:
+            self._send(400, {"message": "Bad Request", "errors": [{"field": "refresh_token", "code": "invalid"}]})
+            return
+        self._send(200, {
+            "token_type": "Bearer",
+            "access_token": f"fake-{athlete_id}",
+            "refresh_token": f"fake-{athlete_id}",
+            "expires_at": int(time.time()) + 6 * 3600,
+            "expires_in": 6 * 3600,
+            "athlete": {"id": athlete_id, "firstname": "Fake", "lastname": str(athlete_id)},
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--activities", type=int, default=1000, help="activities per athlete")
+    parser.add_argument("--segments", type=int, default=60, help="starred segments per athlete")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response latency (ms)")
+    parser.add_argument("--jitter", type=float, help="latency standard deviation (ms, default latency/2)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit", default="200,2000", help="15-minute,daily request limits")
+    args = parser.parse_args(argv)
+
+    short, daily = (int(x) for x in args.rate_limit.split(","))
+    fake = FakeStrava(args.activities, args.segments, args.latency, args.jitter, args.error_rate, short, daily)
+    print(f"fake Strava on {fake.start(args.host, args.port)}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Concurrent load test of the real handlers against a local fake Strava.
+
+    python tools/load_test.py --users 20 --duration 30
+    python tools/load_test.py --users 50 --iterations 3 --latency 120 --error-rate 0.02 --rate-limit 600,30000
+    python tools/load_test.py --strava http://127.0.0.1:8765      # already running tools/fake_strava.py
+
+Each virtual user is one athlete (token "fake-<id>") replaying a dashboard
+visit: every endpoint in --endpoints in turn, in-process through the
+endpoint's `handler` class, with a fresh SQLite store per run. The report
+gives p50/p95/p99 latency, errors, requests slower than --timeout and
+Strava calls per request for each endpoint.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import threading
+import email.message
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+ENDPOINTS = {
+    "dashboard": ("api.dashboard", "/api/dashboard"),
+    "cockpit": ("api.cockpit", "/api/cockpit"),
+    "volume": ("api.volume", "/api/volume?mode=weekly"),
+    "performance": ("api.performance", "/api/performance?mode=projections"),
+    "analysis": ("api.analysis", "/api/analysis?mode=volume_perf"),
+    "activities": ("api.activities", "/api/activities?format=columnar&polyline=lod0"),
+    "segments": ("api.segments", "/api/segments?mode=legends"),
+}
+
+
+def invoke(module, path, token):
+    """Run one GET through an endpoint's handler class; returns (status, body bytes)."""
+    h = module.handler.__new__(module.handler)
+    h.path, h.command, h.request_version = path, "GET", "HTTP/1.1"
+    h.requestline = f"GET {path} HTTP/1.1"
+    h.client_address = ("127.0.0.1", 0)
+    h.headers = email.message.Message()
+    h.headers["Authorization"] = f"Bearer {token}"
+    h.headers["Accept-Encoding"] = "gzip"
+    h.rfile, h.wfile = io.BytesIO(), io.BytesIO()
+    h.log_message = lambda *args: None
+    h.do_GET()
+    raw = h.wfile.getvalue()
+    status = int(raw.split(b" ", 2)[1]) if raw else 0
+    return status, raw
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+class Counter:
+    """Strava calls per token, from the in-process fake or a remote /_stats."""
+
+    def __init__(self, fake=None, url=None):
+        self.fake, self.url = fake, url
+
+    def calls(self, token):
+        if self.fake:
+            return self.fake.stats()["by_token"].get(token, 0)
+        import httpx
+        return httpx.get(f"{self.url}/_stats").json()["by_token"].get(token, 0)
+
+    def totals(self):
+        if self.fake:
+            stats = self.fake.stats()
+        else:
+            import httpx
+            stats = httpx.get(f"{self.url}/_stats").json()
+        return {k: stats[k] for k in ("total", "errors", "rate_limited")}
+
+
+def user(index, endpoints, counter, deadline, iterations, timeout, results, lock):
+    token = f"fake-{1000 + index}"
+    done = 0
+    while (iterations and done < iterations) or (not iterations and time.time() < deadline):
+        for name, (module, path) in endpoints.items():
+            before = counter.calls(token)
+            t0 = time.perf_counter()
+            try:
+                status, raw = invoke(module, path, token)
+            except Exception as e:
+                status, raw = 0, repr(e).encode()
+            elapsed = time.perf_counter() - t0
+            calls = counter.calls(token) - before
+            with lock:
+                r = results[name]
+                r["latency"].append(elapsed * 1000)
+                r["calls"] += calls
+                r["errors"] += status == 0 or status >= 500
+                r["timeouts"] += elapsed > timeout
+                if (status == 0 or status >= 500) and not r["sample_error"]:
+                    r["sample_error"] = raw.rpartition(b"\r\n\r\n")[2][:200].decode(errors="replace")
+            if not iterations and time.time() >= deadline:
+                return
+        done += 1
+
+
+def report(results, wall, totals, users):
+    rows = []
+    for name, r in results.items():
+        n = len(r["latency"])
+        rows.append({
+            "endpoint": name, "requests": n,
+            "p50_ms": round(percentile(r["latency"], 50), 1),
+            "p95_ms": round(percentile(r["latency"], 95), 1),
+            "p99_ms": round(percentile(r["latency"], 99), 1),
+            "errors": r["errors"], "timeouts": r["timeouts"],
+            "timeout_rate": round(r["timeouts"] / n, 4) if n else 0,
+            "strava_calls_per_request": round(r["calls"] / n, 2) if n else 0,
+            "sample_error": r["sample_error"],
+        })
+    requests = sum(r["requests"] for r in rows)
+    return {"users": users, "wall_s": round(wall, 2), "requests": requests,
+            "throughput_rps": round(requests / wall, 1) if wall else 0, "strava": totals, "endpoints": rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds (ignored with --iterations)")
+    parser.add_argument("--iterations", type=int, default=0, help="dashboard visits per user")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a request counts as timed out")
+    parser.add_argument("--strava", help="base URL of a running fake Strava (default: start one in-process)")
+    parser.add_argument("--activities", type=int, default=1000, help="activities per athlete")
+    parser.add_argument("--latency", type=float, default=50.0, help="fake Strava mean latency (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", default="200,2000", help="15-minute,daily request limits")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    fake = None
+    if args.strava:
+        base = args.strava.rstrip("/")
+    else:
+        from tools.fake_strava import FakeStrava
+        short, daily = (int(x) for x in args.rate_limit.split(","))
+        fake = FakeStrava(args.activities, latency_ms=args.latency, error_rate=args.error_rate,
+                          short_limit=short, daily_limit=daily)
+        base = fake.start()
+    # must be set before the api modules are imported
+    os.environ["STRAVA_BASE_URL"] = base
+    os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "load.db"))
+
+    endpoints = {name: (importlib.import_module(ENDPOINTS[name][0]), ENDPOINTS[name][1])
+                 for name in args.endpoints.split(",")}
+    counter = Counter(fake, None if fake else base)
+    results = {name: {"latency": [], "calls": 0, "errors": 0, "timeouts": 0, "sample_error": ""}
+               for name in endpoints}
+    lock = threading.Lock()
+
+    t0 = time.perf_counter()
+    deadline = time.time() + args.duration
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for f in [pool.submit(user, i, endpoints, counter, deadline, args.iterations, args.timeout, results, lock)
+                  for i in range(args.users)]:
+            f.result()
+    out = report(results, time.perf_counter() - t0, counter.totals(), args.users)
+    if fake:
+        fake.stop()
+
+    if args.json:
+        print(json.dumps(out, indent=1))
+        return
+    print(f"{out['users']} users, {out['requests']} requests in {out['wall_s']} s "
+          f"({out['throughput_rps']} req/s), Strava: {out['strava']}")
+    print(f"{'endpoint':<12} {'req':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>4} {'t/o':>4} {'calls/req':>10}")
+    for r in out["endpoints"]:
+        print(f"{r['endpoint']:<12} {r['requests']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+              f"{r['errors']:>4} {r['timeouts']:>4} {r['strava_calls_per_request']:>10}")
+    for r in out["endpoints"]:
+        if r["sample_error"]:
+            print(f"{r['endpoint']}: {r['sample_error']}")
+
+
+if __name__ == "__main__":
+    main()
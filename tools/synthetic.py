@@ -0,0 +1,144 @@
+"""Deterministic synthetic Strava activities for benchmarks and load tests.
+
+    from tools.synthetic import generate
+    acts = generate(10_000)              # same list for the same (n, seed, end)
+
+Activities look like /athlete/activities summaries: mostly runs (some rides
+and walks), easy/long/tempo runs plus occasional 5k/10k/semi/marathon races,
+paces and heart rates that improve slowly over time, and a summary polyline
+whose length follows the distance. Dates run up to `end`, several per day
+when n is large (the span is capped at MAX_YEARS).
+"""
+import os
+import sys
+import math
+import random
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api._polyline import encode_ints  # noqa: E402
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+MAX_YEARS = 15
+
+# (kind, weight, distance range in m)
+RUN_KINDS = [
+    ("easy", 55, (5000, 12000)),
+    ("long", 15, (15000, 32000)),
+    ("tempo", 15, (6000, 14000)),
+    ("5k", 6, (4950, 5150)),
+    ("10k", 5, (9950, 10300)),
+    ("semi", 3, (21100, 21500)),
+    ("marathon", 1, (42195, 42800)),
+]
+PACE_FACTOR = {"easy": 1.15, "long": 1.2, "tempo": 1.0, "5k": 0.88, "10k": 0.92, "semi": 0.97, "marathon": 1.03}
+
+
+def parse_size(s):
+    return SIZES.get(s) or int(s)
+
+
+def _polyline(rng, distance, origin):
+    """Random-walk track whose point count follows the distance (Strava summary density)."""
+    lat, lng = origin
+    heading = rng.uniform(0, 2 * math.pi)
+    points = []
+    n = max(2, min(400, int(distance / 60)))
+    step = distance / n
+    for _ in range(n):
+        heading += rng.gauss(0, 0.25)
+        lat += step * math.cos(heading) / 111320
+        lng += step * math.sin(heading) / (111320 * math.cos(math.radians(lat)))
+        points.append((round(lat * 1e5), round(lng * 1e5)))
+    return encode_ints(points)
+
+
+def generate(n, seed=1, end=None, polylines=True):
+    """`n` activities ordered oldest first, ids increasing."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    span_days = min(int(n * 1.5), MAX_YEARS * 365)
+    start = datetime.combine(end - timedelta(days=span_days), datetime.min.time())
+    kinds, weights = zip(*[(k, w) for k, w, _ in RUN_KINDS])
+    ranges = {k: r for k, _, r in RUN_KINDS}
+    home = (48.85 + rng.uniform(-0.1, 0.1), 2.35 + rng.uniform(-0.1, 0.1))
+
+    acts = []
+    for i in range(n):
+        progress = i / max(n - 1, 1)
+        local = start + timedelta(days=span_days * progress, hours=rng.uniform(6, 20))
+        local = local.replace(microsecond=0)
+        roll = rng.random()
+        a_type = "Run" if roll < 0.85 else ("Ride" if roll < 0.95 else "Walk")
+
+        if a_type == "Run":
+            kind = rng.choices(kinds, weights)[0]
+            distance = rng.uniform(*ranges[kind])
+            # threshold pace improves from 5:00 to 4:15 /km over the span
+            pace = (300 - 45 * progress) * PACE_FACTOR[kind] * rng.uniform(0.96, 1.05)
+            hr = 150 + 18 * (1.15 - PACE_FACTOR[kind]) / 0.27 + rng.gauss(0, 4)
+            name = {"easy": "Footing", "long": "Sortie longue", "tempo": "Tempo"}.get(kind, f"Course {kind}")
+        elif a_type == "Ride":
+            distance, pace, hr, name = rng.uniform(20000, 90000), rng.uniform(100, 150), 135 + rng.gauss(0, 6), "Velo"
+        else:
+            distance, pace, hr, name = rng.uniform(2000, 8000), rng.uniform(600, 800), 100 + rng.gauss(0, 5), "Marche"
+
+        distance = round(distance, 1)
+        moving = int(distance / 1000 * pace)
+        has_hr = rng.random() < 0.9
+        acts.append({
+            "id": 10_000_000 + i,
+            "type": a_type,
+            "name": name,
+            "distance": distance,
+            "moving_time": moving,
+            "elapsed_time": moving + rng.randint(0, 600),
+            "total_elevation_gain": round(distance / 1000 * rng.uniform(2, 15), 1),
+            "start_date": local.replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "start_date_local": local.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "average_speed": round(1000 / pace, 3),
+            "max_speed": round(1000 / pace * rng.uniform(1.2, 1.6), 3),
+            "average_heartrate": round(hr, 1) if has_hr else None,
+            "max_heartrate": round(hr + rng.uniform(8, 20)) if has_hr else None,
+            "suffer_score": round(moving / 60 * (hr - 100) / 40) if has_hr else None,
+            "pr_count": rng.choice([0, 0, 0, 1, 2]),
+            "start_latlng": [round(home[0], 5), round(home[1], 5)],
+            "end_latlng": [round(home[0], 5), round(home[1], 5)],
+            "map": {"summary_polyline": _polyline(rng, distance, home) if polylines else ""},
+        })
+    return acts
+
+
+def streams(a, resolution=1):
+    """Strava-style streams (key_by_type) for one activity: 1 Hz time, heart rate
+    drifting up with fatigue, noisy velocity and an altitude random walk."""
+    rng = random.Random(a["id"])
+    n = max(2, int(a["moving_time"] / resolution))
+    speed = a["average_speed"] or 1.0
+    hr = a.get("average_heartrate")
+    drift = rng.uniform(0.02, 0.08)
+    t, v, h, alt = [], [], [], []
+    elapsed, z = 0, 100.0 + rng.uniform(0, 200)
+    for i in range(n):
+        elapsed += resolution + (rng.randint(5, 60) if rng.random() < 0.002 else 0)
+        f = i / n
+        t.append(elapsed)
+        v.append(round(max(0.0, speed * (1 + 0.04 * math.sin(i / 90) - drift * (f - 0.5) + rng.gauss(0, 0.05))), 3))
+        if hr:
+            h.append(round(hr * (1 - drift / 2 + drift * f) + rng.gauss(0, 2)))
+        z += rng.gauss(0, 0.3)
+        alt.append(round(z, 1))
+    out = {
+        "time": {"data": t, "series_type": "distance", "original_size": n, "resolution": "high"},
+        "velocity_smooth": {"data": v, "series_type": "distance", "original_size": n, "resolution": "high"},
+        "altitude": {"data": alt, "series_type": "distance", "original_size": n, "resolution": "high"},
+    }
+    if hr:
+        out["heartrate"] = {"data": h, "series_type": "distance", "original_size": n, "resolution": "high"}
+    return out
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(generate(parse_size(sys.argv[1]) if len(sys.argv) > 1 else 10)))
@@ -0,0 +1,66 @@
+"""Send fake Strava push events to the webhook handler.
+
+    python tools/webhook_events.py validate create:42:1001 update:42:1001:title=Tempo delete:42:1001 deauth:42
+
+Without --url the api.webhook handler is served on an ephemeral local port,
+so the store configured by SQLITE_PATH is updated in-process.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+
+def build_event(spec, subscription_id):
+    kind, *rest = spec.split(":")
+    owner = int(rest[0])
+    if kind == "deauth":
+        return {"object_type": "athlete", "object_id": owner, "aspect_type": "update", "owner_id": owner,
+                "updates": {"authorized": "false"}, "event_time": int(time.time()),
+                "subscription_id": subscription_id}
+    updates = dict(u.split("=", 1) for u in rest[2:])
+    return {"object_type": "activity", "object_id": int(rest[1]), "aspect_type": kind, "owner_id": owner,
+            "updates": updates, "event_time": int(time.time()), "subscription_id": subscription_id}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("events", nargs="+", help="validate | create|update|delete:<owner>:<activity>[:k=v] | deauth:<owner>")
+    parser.add_argument("--url", help="webhook URL (default: serve api.webhook locally)")
+    parser.add_argument("--verify-token", default=os.environ.get("STRAVA_VERIFY_TOKEN", "local-verify"))
+    parser.add_argument("--subscription-id", type=int, default=int(os.environ.get("STRAVA_SUBSCRIPTION_ID", "1")))
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if not url:
+        os.environ.setdefault("STRAVA_VERIFY_TOKEN", args.verify_token)
+        from api import webhook
+        webhook.VERIFY_TOKEN = args.verify_token
+        webhook.SUBSCRIPTION_ID = str(args.subscription_id)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), webhook.handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/webhook"
+
+    with httpx.Client(timeout=30.0) as client:
+        for spec in args.events:
+            if spec == "validate":
+                r = client.get(url, params={"hub.mode": "subscribe", "hub.verify_token": args.verify_token,
+                                            "hub.challenge": "fake-challenge"})
+            else:
+                r = client.post(url, json=build_event(spec, args.subscription_id))
+            print(f"{spec:<32} {r.status_code} {json.dumps(r.json())}")
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()